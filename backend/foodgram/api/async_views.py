@@ -0,0 +1,168 @@
+"""Асинхронные представления для чтения под ASGI.
+
+В Django 3.2 нет асинхронного ORM, поэтому обращения к базе выполняются
+в пуле потоков (sync_to_async с thread_sensitive=False), а независимые
+запросы — количество объектов, страница и связи пользователя —
+выполняются одновременно. Изменяющие запросы передаются
+синхронным представлениям DRF.
+"""
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage, Page
+from django.db import close_old_connections
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+from .relations import get_relations
+from .serializers import SubscriptionSerializer
+from .views import (CustomUserViewSet, IngredientViewSet, RecipeViewSet,
+                    TagViewSet)
+
+
+def in_thread(function):
+    """Выполняет функцию в пуле потоков, не блокируя цикл событий.
+    Соединения с базой в потоках закрываются по правилам CONN_MAX_AGE.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper, thread_sensitive=False)
+
+
+def render(response):
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+def offload(view):
+    """Асинхронная обертка синхронного представления."""
+    run = in_thread(lambda request, *args, **kwargs: render(
+        view(request, *args, **kwargs)
+    ))
+
+    async def async_view(request, *args, **kwargs):
+        return await run(request, *args, **kwargs)
+    async_view.csrf_exempt = True
+    return async_view
+
+
+def async_read_view(viewset, actions, handler):
+    """GET обрабатывает handler, остальные методы — представление DRF."""
+    sync_view = offload(viewset.as_view(actions))
+    initkwargs = getattr(getattr(viewset, actions['get']), 'kwargs', {})
+
+    async def async_view(request, *args, **kwargs):
+        if request.method != 'GET':
+            return await sync_view(request, *args, **kwargs)
+        view = viewset(**initkwargs)
+        view.action_map = {'get': actions['get']}
+        view.args, view.kwargs = args, kwargs
+        view.headers = view.default_response_headers
+        view.request = view.initialize_request(request, *args, **kwargs)
+        try:
+            await in_thread(view.initial)(view.request, *args, **kwargs)
+            response = await handler(view, view.request)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+        return await in_thread(lambda: render(
+            view.finalize_response(view.request, response, *args, **kwargs)
+        ))()
+    async_view.csrf_exempt = True
+    return async_view
+
+
+async def paginate(view, request, queryset):
+    """Страница, количество объектов и связи пользователя одновременно.
+    Возвращает None, если нужна обычная пагинация DRF.
+    """
+    paginator = view.paginator
+    if paginator.use_keyset(request):
+        return None
+    try:
+        number = int(request.query_params.get(paginator.page_query_param, 1))
+    except ValueError:
+        return None
+    if number < 1:
+        return None
+    size = paginator.get_page_size(request)
+    django_paginator = paginator.django_paginator_class(queryset, size)
+    offset = (number - 1) * size
+    count, items, _ = await asyncio.gather(
+        in_thread(queryset.count)(),
+        in_thread(lambda: list(queryset[offset:offset + size]))(),
+        in_thread(get_relations)(request),
+    )
+    django_paginator.count = count
+    try:
+        number = django_paginator.validate_number(number)
+    except InvalidPage as exc:
+        raise NotFound(paginator.invalid_page_message.format(
+            page_number=number, message=str(exc)
+        ))
+    paginator.page = Page(items, number, django_paginator)
+    paginator.request = request
+    paginator.keyset = None
+    return items
+
+
+async def recipe_list_handler(view, request):
+    queryset = await in_thread(view.filter_queryset)(view.get_queryset())
+    items = await paginate(view, request, queryset)
+    if items is None:
+        return await in_thread(view.list)(request)
+    data = await in_thread(
+        lambda: view.get_serializer(items, many=True).data
+    )()
+    return view.get_paginated_response(data)
+
+
+async def recipe_detail_handler(view, request):
+    recipe, _ = await asyncio.gather(
+        in_thread(view.get_object)(),
+        in_thread(get_relations)(request),
+    )
+    data = await in_thread(lambda: view.get_serializer(recipe).data)()
+    return Response(data)
+
+
+async def subscriptions_handler(view, request):
+    queryset = view.subscribed_authors(request)
+    authors = await paginate(view, request, queryset)
+    if authors is None:
+        return await in_thread(view.subscriptions)(request)
+
+    def serialize():
+        return SubscriptionSerializer(authors, many=True, context={
+            'request': request,
+            'recipes': SubscriptionSerializer.recipes_by_author(
+                authors, request
+            )
+        }).data
+    return view.get_paginated_response(await in_thread(serialize)())
+
+
+recipe_list = async_read_view(
+    RecipeViewSet, {'get': 'list', 'post': 'create'}, recipe_list_handler
+)
+recipe_detail = async_read_view(
+    RecipeViewSet,
+    {
+        'get': 'retrieve', 'put': 'update',
+        'patch': 'partial_update', 'delete': 'destroy'
+    },
+    recipe_detail_handler
+)
+subscriptions = async_read_view(
+    CustomUserViewSet, {'get': 'subscriptions'}, subscriptions_handler
+)
+tag_list = offload(TagViewSet.as_view({'get': 'list'}))
+tag_detail = offload(TagViewSet.as_view({'get': 'retrieve'}))
+ingredient_list = offload(IngredientViewSet.as_view({'get': 'list'}))
+ingredient_detail = offload(IngredientViewSet.as_view({'get': 'retrieve'}))
@@ -0,0 +1,144 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from recipes.cache import is_shared_cache
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from users.models import CustomUser
+
+TOKEN_KEY = 'api:token:{}'
+# Метка отозванного токена: не дает запросу, прочитавшему токен из базы
+# до выхода пользователя, вернуть его в кэш.
+REVOKED = 'revoked'
+REVOKED_TIMEOUT = 10
+
+
+class LocalCache:
+    """Кэш процесса с ограниченным размером и вытеснением
+    давно не использованных записей.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_CACHE_MAX_SIZE:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_tokens = LocalCache()
+
+
+def get_cache_key(key):
+    """Ключ кэша по хэшу токена, чтобы токены не попадали в ключи."""
+    return TOKEN_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшированием токена и пользователя
+    в общем кэше Django (если он общий для процессов) и, если это
+    включено, в памяти процесса.
+
+    Пользователь загружается без счетчиков: они меняются чаще, чем
+    сбрасывается кэш, и при обращении читаются из базы.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = get_cache_key(key)
+        token = local_tokens.get(cache_key)
+        if token is None:
+            token, cacheable = self.get_cached_token(key, cache_key)
+            if cacheable and settings.TOKEN_LOCAL_CACHE_TIMEOUT:
+                local_tokens.set(
+                    cache_key, token, settings.TOKEN_LOCAL_CACHE_TIMEOUT
+                )
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        token = copy.copy(token)
+        token.user = copy.copy(token.user)
+        return token.user, token
+
+    def get_cached_token(self, key, cache_key):
+        """Возвращает токен и признак того, что его можно положить
+        в кэш процесса.
+        """
+        if not is_shared_cache():
+            return self.get_token(key), True
+        token = cache.get(cache_key)
+        if token == REVOKED:
+            return self.get_token(key), False
+        if token is None:
+            token = self.get_token(key)
+            if not cache.add(cache_key, token, settings.TOKEN_CACHE_TIMEOUT):
+                return token, False
+        return token, True
+
+    def get_token(self, key):
+        model = self.get_model()
+        try:
+            return model.objects.select_related('user').defer(*(
+                f'user__{name}' for name in CustomUser.COUNTER_FIELDS
+            )).get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+
+def invalidate_tokens(keys):
+    cache_keys = [get_cache_key(key) for key in keys]
+    cache.set_many(
+        {cache_key: REVOKED for cache_key in cache_keys}, REVOKED_TIMEOUT
+    )
+    for cache_key in cache_keys:
+        local_tokens.delete(cache_key)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Выход через token/logout удаляет токен из кэшей."""
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """Смена пароля, деактивация и другие изменения пользователя
+    сбрасывают закэшированные токены с устаревшими данными.
+    """
+    if not created:
+        invalidate_tokens(
+            Token.objects.filter(user=instance).values_list('key', flat=True)
+        )
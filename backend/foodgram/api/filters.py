@@ -1,17 +1,36 @@
 from django_filters import rest_framework as filter
 from recipes.models import Recipe, Tag
-from rest_framework.filters import SearchFilter
+from recipes.search import ingredient_index, search_recipes
+from rest_framework.filters import OrderingFilter, SearchFilter
 
 
 class IngredientSearchFilter(SearchFilter):
+    """Поиск ингредиентов по индексу в памяти, без запросов к базе."""
     search_param = 'name'
 
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param)
+        if not name or view.action != 'list':
+            return queryset
+        return ingredient_index.search(name)
+
+
+class RecipeSearchFilter(SearchFilter):
+    """Полнотекстовый поиск рецептов с сортировкой по релевантности."""
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get(self.search_param, '').strip()
+        if not value or view.action != 'list':
+            return queryset
+        return search_recipes(queryset, value)
+
 
 class RecipeFilter(filter.FilterSet):
     tags = filter.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
+        method='filter_tags'
     )
     is_favorited = filter.NumberFilter(method='filter_is_favorited')
     is_in_shopping_cart = filter.NumberFilter(
@@ -22,6 +41,11 @@ class RecipeFilter(filter.FilterSet):
         model = Recipe
         fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',)
 
+    def filter_tags(self, queryset, name, value):
+        if value:
+            return queryset.with_any_tag(value)
+        return queryset
+
     def filter_is_favorited(self, queryset, name, value):
         if value:
             return queryset.filter(favorites__user=self.request.user)
@@ -31,3 +55,20 @@ class RecipeFilter(filter.FilterSet):
         if value:
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """Сортировка рецептов с уникальным ключом в конце,
+    чтобы порядок был стабильным и подходил для пагинации по курсору.
+    """
+    tie_breakers = ('-pub_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        fields = {field.lstrip('-') for field in ordering}
+        return tuple(ordering) + tuple(
+            field for field in self.tie_breakers
+            if field.lstrip('-') not in fields
+        )
@@ -0,0 +1,82 @@
+"""Кэш представлений рецептов, не зависящих от пользователя.
+
+Фрагмент хранится по id рецепта и версиям рецепта, его автора,
+тегов и ингредиентов. Поля is_favorited, is_in_shopping_cart и
+author.is_subscribed подставляются при каждом ответе.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from recipes.cache import AUTHOR_VERSION, RECIPE_VERSION, get_versions
+
+from .relations import get_relations
+
+FRAGMENT_KEY = 'api:recipe:{origin}:{id}:{versions}'
+
+
+def get_fragment_keys(recipes, request):
+    """recipes — пары (id рецепта, id автора)."""
+    versions = get_versions(
+        ['tags', 'ingredients']
+        + [RECIPE_VERSION.format(recipe_id) for recipe_id, _ in recipes]
+        + [AUTHOR_VERSION.format(author_id) for _, author_id in recipes]
+    )
+    origin = request.build_absolute_uri('/') if request is not None else ''
+    return {
+        recipe_id: FRAGMENT_KEY.format(
+            origin=origin,
+            id=recipe_id,
+            versions='.'.join(str(versions[name]) for name in (
+                RECIPE_VERSION.format(recipe_id),
+                AUTHOR_VERSION.format(author_id),
+                'tags', 'ingredients'
+            ))
+        )
+        for recipe_id, author_id in recipes
+    }
+
+
+def cached_representations(recipes, request, build):
+    """Представления рецептов с полями текущего пользователя.
+
+    recipes — пары (id рецепта, id автора); build(ids) возвращает
+    {id: представление} для рецептов, которых нет в кэше.
+    """
+    timeout = settings.RECIPE_FRAGMENT_CACHE_TIMEOUT
+    if not timeout:
+        fragments = build([recipe_id for recipe_id, _ in recipes])
+    else:
+        keys = get_fragment_keys(recipes, request)
+        cached = cache.get_many(keys.values())
+        fragments = {
+            recipe_id: cached[key]
+            for recipe_id, key in keys.items() if key in cached
+        }
+        missing = [
+            recipe_id for recipe_id, _ in recipes
+            if recipe_id not in fragments
+        ]
+        if missing:
+            built = build(missing)
+            cache.set_many(
+                {keys[recipe_id]: built[recipe_id] for recipe_id in missing},
+                timeout
+            )
+            fragments.update(built)
+    relations = get_relations(request)
+    return [
+        personalize(fragments[recipe_id], relations)
+        for recipe_id, _ in recipes
+    ]
+
+
+def personalize(fragment, relations):
+    data = dict(fragment)
+    data['author'] = dict(
+        fragment['author'],
+        is_subscribed=fragment['author']['id'] in relations['following']
+    )
+    data['is_favorited'] = fragment['id'] in relations['favorites']
+    data['is_in_shopping_cart'] = (
+        fragment['id'] in relations['shopping_cart']
+    )
+    return data
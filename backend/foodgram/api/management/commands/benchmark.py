@@ -0,0 +1,197 @@
+import json
+import math
+import random
+import subprocess
+import time
+
+from api.serializers import RecipeSerializer, ShortRecipeSerializer
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from recipes.models import Ingredient, Recipe, ShoppingCart
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from users.models import CustomUser
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(values, rank):
+    """Перцентиль по методу ближайшего ранга."""
+    return values[max(math.ceil(len(values) * rank / 100) - 1, 0)]
+
+
+def summarize(timings, queries=None):
+    timings = sorted(timings)
+    summary = {
+        'iterations': len(timings),
+        'latency_ms': {
+            'min': round(timings[0], 3),
+            **{
+                f'p{rank}': round(percentile(timings, rank), 3)
+                for rank in PERCENTILES
+            },
+            'max': round(timings[-1], 3),
+            'mean': round(sum(timings) / len(timings), 3),
+        },
+    }
+    if queries:
+        summary['queries'] = {'min': min(queries), 'max': max(queries)}
+    return summary
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', 'HEAD'),
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the main API endpoints and serializers and print '
+        'latency percentiles and query counts as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Untimed runs before each benchmark'
+        )
+        parser.add_argument(
+            '--user', type=int,
+            help='Id of the user making the requests'
+        )
+        parser.add_argument(
+            '--only', action='append', default=[],
+            help='Run only benchmarks with this name (repeatable)'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON to this file')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be positive')
+        self.user = self.get_user(options['user'])
+        self.rng = random.Random(options['seed'])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe_ids = list(
+            Recipe.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            )[:100]
+        )
+        self.ingredient_names = list(
+            Ingredient.objects.values_list('name', flat=True)[:100]
+        )
+        if not self.recipe_ids or not self.ingredient_names:
+            raise CommandError(
+                'No data to benchmark: run generate_fake_data first'
+            )
+        results = {}
+        for name, function in self.get_benchmarks():
+            if options['only'] and name not in options['only']:
+                continue
+            for _ in range(options['warmup']):
+                function()
+            timings, queries = [], []
+            for _ in range(options['iterations']):
+                with CaptureQueriesContext(connection) as context:
+                    started = time.perf_counter()
+                    function()
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries.append(len(context))
+            results[name] = summarize(timings, queries)
+            self.stderr.write(
+                f'{name}: p50 {results[name]["latency_ms"]["p50"]} ms, '
+                f'{results[name]["queries"]["max"]} queries'
+            )
+        report = json.dumps({
+            'revision': git_revision(),
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'user': self.user.id,
+            'recipes': Recipe.objects.count(),
+            'results': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        else:
+            self.stdout.write(report)
+
+    @staticmethod
+    def get_user(user_id):
+        if user_id is not None:
+            return CustomUser.objects.get(pk=user_id)
+        cart = ShoppingCart.objects.order_by('user_id').first()
+        user = cart.user if cart else CustomUser.objects.first()
+        if user is None:
+            raise CommandError('No users: run generate_fake_data first')
+        return user
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        if response.status_code != 200:
+            raise CommandError(f'{url}: HTTP {response.status_code}')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def get_request(self):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = self.user
+        return request
+
+    def get_benchmarks(self):
+        def recipe_list():
+            self.get('/api/recipes/', limit=6)
+
+        def recipe_list_cursor():
+            self.get('/api/recipes/', limit=6, pagination='cursor')
+
+        def recipe_detail():
+            self.get(f'/api/recipes/{self.rng.choice(self.recipe_ids)}/')
+
+        def subscriptions():
+            self.get('/api/users/subscriptions/', recipes_limit=3)
+
+        def shopping_list():
+            self.get('/api/recipes/download_shopping_cart/')
+
+        def ingredient_search():
+            self.get(
+                '/api/ingredients/',
+                name=self.rng.choice(self.ingredient_names)[:3]
+            )
+
+        def serialize_recipes():
+            recipes = Recipe.objects.with_related().filter(
+                id__in=self.recipe_ids[:6]
+            )
+            RecipeSerializer(
+                recipes, many=True, context={'request': self.get_request()}
+            ).data
+
+        def serialize_short_recipes():
+            ShortRecipeSerializer(
+                Recipe.objects.filter(id__in=self.recipe_ids[:6]), many=True
+            ).data
+
+        return (
+            ('recipe_list', recipe_list),
+            ('recipe_list_cursor', recipe_list_cursor),
+            ('recipe_detail', recipe_detail),
+            ('subscriptions', subscriptions),
+            ('shopping_list', shopping_list),
+            ('ingredient_search', ingredient_search),
+            ('serializer_recipe', serialize_recipes),
+            ('serializer_short_recipe', serialize_short_recipes),
+        )
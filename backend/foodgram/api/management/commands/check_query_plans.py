@@ -0,0 +1,160 @@
+from api.views import CustomUserViewSet, RecipeViewSet
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.models import (Favorite, Recipe, RecipesIngredient, RecipesTag,
+                            ShoppingCart, ShoppingCartIngredient, Tag)
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from users.models import Subscription
+
+PAGE_SIZE = 6
+
+
+def get_request(user, params=None):
+    request = APIRequestFactory().get('/', params)
+    force_authenticate(request, user)
+    return request
+
+
+def filter_recipes(user, params):
+    """Рецепты так, как их отбирают фильтры RecipeViewSet.list."""
+    view = RecipeViewSet(action_map={'get': 'list'}, args=(), kwargs={})
+    view.format_kwarg = None
+    view.request = view.initialize_request(get_request(user, params))
+    return view.filter_queryset(view.get_queryset())[:PAGE_SIZE]
+
+
+def get_queries(user, recipe):
+    """Запросы, которые выполняют основные эндпоинты API.
+    Рецепты отбираются через get_queryset() и filter_queryset()
+    представления, чтобы проверялись те же запросы, что и в API.
+    """
+    tag = Tag.objects.order_by('id').first()
+    authors = CustomUserViewSet.subscribed_authors(
+        Request(get_request(user))
+    )
+    latest = Recipe.objects.latest_by_author(
+        list(authors[:PAGE_SIZE].values_list('id', flat=True)), 3
+    )
+    return (
+        ('recipe feed', filter_recipes(user, {})),
+        ('popular recipes', filter_recipes(
+            user, {'ordering': '-favorites_count'}
+        )),
+        ('author recipes', filter_recipes(user, {'author': recipe.author_id})),
+        ('recipes by tag', filter_recipes(
+            user, {'tags': tag.slug if tag else ''}
+        )),
+        ('favorited recipes', filter_recipes(user, {'is_favorited': 1})),
+        ('recipes in shopping cart', filter_recipes(
+            user, {'is_in_shopping_cart': 1}
+        )),
+        ('recipe search', filter_recipes(
+            user, {'search': recipe.name.split()[0]}
+        )),
+        ('recipe ingredients', RecipesIngredient.objects.filter(
+            recipe_id__in=[recipe.id]
+        )),
+        ('recipe tags', RecipesTag.objects.filter(
+            recipe_id__in=[recipe.id]
+        )),
+        ('favorite lookup', Favorite.objects.filter(
+            user=user, recipe=recipe
+        )),
+        ('user favorites', Favorite.objects.filter(
+            user=user
+        ).values_list('recipe_id')),
+        ('shopping cart lookup', ShoppingCart.objects.filter(
+            user=user, recipe=recipe
+        )),
+        ('shopping list', ShoppingCartIngredient.objects.filter(user=user)),
+        ('subscriptions', Subscription.objects.filter(user=user)),
+        ('subscribed authors', authors[:PAGE_SIZE]),
+        ('latest recipes by author', latest),
+    )
+
+
+def get_sql(query):
+    """SQL и параметры QuerySet или RawQuerySet."""
+    if hasattr(query, 'raw_query'):
+        return query.raw_query, tuple(query.params)
+    return query.query.sql_with_params()
+
+
+def postgresql_seq_scans(cursor, sql, params):
+    cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+    nodes = [cursor.fetchone()[0][0]['Plan']]
+    tables = []
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Seq Scan':
+            tables.append(node['Relation Name'])
+        nodes.extend(node.get('Plans', ()))
+    return tables
+
+
+def sqlite_seq_scans(cursor, sql, params):
+    """Полные просмотры таблиц. Просмотры подзапросов и поиск
+    по виртуальной таблице FTS5 (VIRTUAL TABLE INDEX) не считаются.
+    """
+    tables = set(connection.introspection.table_names(cursor))
+    cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+    return [
+        detail.split()[1] for *_, detail in cursor.fetchall()
+        if detail.startswith('SCAN ') and ' USING ' not in detail
+        and ' VIRTUAL TABLE ' not in detail and detail.split()[1] in tables
+    ]
+
+
+SEQ_SCANS = {
+    'postgresql': postgresql_seq_scans,
+    'sqlite': sqlite_seq_scans,
+}
+
+
+class Command(BaseCommand):
+    help = 'Fail if the main API queries fall back to sequential scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            default=1,
+            help='User id used in the queries'
+        )
+        parser.add_argument(
+            '--recipe',
+            type=int,
+            default=1,
+            help='Recipe id used in the queries'
+        )
+
+    def handle(self, *args, **options):
+        seq_scans = SEQ_SCANS.get(connection.vendor)
+        if seq_scans is None:
+            raise CommandError(f'{connection.vendor} is not supported')
+        user = get_user_model().objects.filter(pk=options['user']).first()
+        recipe = Recipe.objects.filter(pk=options['recipe']).first()
+        if user is None or recipe is None:
+            raise CommandError(
+                'User or recipe not found: run generate_fake_data first'
+            )
+        failed = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Планировщик выберет индекс всегда, когда он подходит,
+                # независимо от объема данных.
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, query in get_queries(user, recipe):
+                tables = seq_scans(cursor, *get_sql(query))
+                if tables:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(
+                        f'{name}: sequential scan on {", ".join(tables)}'
+                    ))
+                else:
+                    self.stdout.write(f'{name}: OK')
+        if failed:
+            raise CommandError(f'{failed} queries use sequential scans')
+        self.stdout.write(self.style.SUCCESS('All queries use indexes'))
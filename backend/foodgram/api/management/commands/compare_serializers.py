@@ -0,0 +1,143 @@
+import json
+import time
+
+from api.fast_serializers import RECIPE_VALUES, FastRecipeSerializer
+from api.serializers import RecipeSerializer
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from recipes.models import Recipe
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .benchmark import Command as BenchmarkCommand
+from .benchmark import git_revision, percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Check that FastRecipeSerializer renders the same bytes as '
+        'RecipeSerializer and report the CPU time per page of both, '
+        'with the recipe fragment cache disabled'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument(
+            '--user', type=int,
+            help='Id of the user making the requests'
+        )
+        parser.add_argument('--output', help='Write the JSON to this file')
+
+    @override_settings(RECIPE_FRAGMENT_CACHE_TIMEOUT=0)
+    def handle(self, *args, **options):
+        if min(options['pages'], options['limit'], options['iterations']) < 1:
+            raise CommandError(
+                '--pages, --limit and --iterations must be positive'
+            )
+        self.user = BenchmarkCommand.get_user(options['user'])
+        ids = list(
+            Recipe.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            )[:options['pages'] * options['limit']]
+        )
+        if not ids:
+            raise CommandError(
+                'No data to compare: run generate_fake_data first'
+            )
+        pages = [
+            ids[index:index + options['limit']]
+            for index in range(0, len(ids), options['limit'])
+        ]
+        for page in pages:
+            self.check_parity(page)
+        self.check_api(ids[0])
+        timings = {'serializer': [], 'fast_serializer': []}
+        for _ in range(options['iterations']):
+            for page in pages:
+                timings['serializer'].append(self.cpu_time(
+                    self.render_serializer, page
+                ))
+                timings['fast_serializer'].append(self.cpu_time(
+                    self.render_fast, page
+                ))
+        results = {
+            name: {
+                'p50': round(percentile(sorted(values), 50), 3),
+                'mean': round(sum(values) / len(values), 3),
+            }
+            for name, values in timings.items()
+        }
+        saved = (
+            results['serializer']['mean']
+            - results['fast_serializer']['mean']
+        )
+        report = json.dumps({
+            'revision': git_revision(),
+            'pages': len(pages),
+            'page_size': options['limit'],
+            'cpu_ms_per_page': results,
+            'saved_cpu_ms_per_page': round(saved, 3),
+            'saved_percent': round(
+                saved / results['serializer']['mean'] * 100, 1
+            ),
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        else:
+            self.stdout.write(report)
+
+    def get_request(self):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = self.user
+        return request
+
+    def render_serializer(self, ids):
+        recipes = Recipe.objects.with_related().filter(
+            id__in=ids
+        ).order_by('-pub_date', '-id')
+        return JSONRenderer().render(RecipeSerializer(
+            recipes, many=True, context={'request': self.get_request()}
+        ).data)
+
+    def render_fast(self, ids):
+        rows = Recipe.objects.values(*RECIPE_VALUES).filter(
+            id__in=ids
+        ).order_by('-pub_date', '-id')
+        return JSONRenderer().render(FastRecipeSerializer(
+            rows, many=True, context={'request': self.get_request()}
+        ).data)
+
+    @staticmethod
+    def cpu_time(function, *args):
+        started = time.process_time()
+        function(*args)
+        return (time.process_time() - started) * 1000
+
+    def check_parity(self, ids):
+        expected = self.render_serializer(ids)
+        actual = self.render_fast(ids)
+        if actual != expected:
+            raise CommandError(
+                f'Output differs for recipes {ids}:\n'
+                f'{expected.decode()}\n{actual.decode()}'
+            )
+
+    def check_api(self, recipe_id):
+        """Сравнивает ответы API целиком, с пагинацией."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for url in (
+            '/api/recipes/?limit=6',
+            '/api/recipes/?limit=6&pagination=cursor',
+            f'/api/recipes/{recipe_id}/',
+        ):
+            responses = []
+            for enabled in (False, True):
+                with override_settings(FAST_RECIPE_SERIALIZER=enabled):
+                    responses.append(client.get(url).content)
+            if responses[0] != responses[1]:
+                raise CommandError(f'Response differs for {url}')
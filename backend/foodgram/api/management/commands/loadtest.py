@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from .benchmark import summarize
+
+DEFAULT_PATHS = (
+    '/api/recipes/?limit=6',
+    '/api/recipes/?limit=6&page=2',
+    '/api/tags/',
+    '/api/ingredients/?name=мол',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure throughput of a running server with concurrent clients '
+        'and print requests per second and latency percentiles as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000')
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Path to request (repeatable)'
+        )
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Seconds to run'
+        )
+        parser.add_argument('--token', help='Authentication token')
+        parser.add_argument('--label', help='Name of the server profile')
+        parser.add_argument('--output', help='Write the JSON to this file')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or DEFAULT_PATHS
+        headers = (
+            {'Authorization': f'Token {options["token"]}'}
+            if options['token'] else {}
+        )
+        timings = {path: [] for path in paths}
+        errors = {path: 0 for path in paths}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['duration']
+
+        def client(number):
+            session = requests.Session()
+            index = number
+            while time.perf_counter() < deadline:
+                path = paths[index % len(paths)]
+                index += 1
+                started = time.perf_counter()
+                try:
+                    ok = session.get(
+                        options['url'] + path, headers=headers, timeout=30
+                    ).ok
+                except requests.RequestException:
+                    ok = False
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    if ok:
+                        timings[path].append(elapsed)
+                    else:
+                        errors[path] += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            list(executor.map(client, range(options['concurrency'])))
+        elapsed = time.perf_counter() - started
+        total = sum(len(values) for values in timings.values())
+        if not total:
+            raise CommandError(f'No successful requests to {options["url"]}')
+        report = json.dumps({
+            'label': options['label'],
+            'url': options['url'],
+            'concurrency': options['concurrency'],
+            'duration_s': round(elapsed, 3),
+            'requests': total,
+            'errors': sum(errors.values()),
+            'requests_per_second': round(total / elapsed, 1),
+            'latency': summarize(
+                [value for values in timings.values() for value in values]
+            ),
+            'paths': {
+                path: {
+                    **summarize(values), 'errors': errors[path]
+                } if values else {'errors': errors[path]}
+                for path, values in timings.items()
+            },
+        }, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        else:
+            self.stdout.write(report)
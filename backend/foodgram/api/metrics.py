@@ -0,0 +1,126 @@
+import threading
+
+from django.conf import settings
+
+# Границы корзин гистограммы времени ответа, в секундах.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class Series:
+    """Накопленные показатели одного сочетания меток."""
+    __slots__ = (
+        'count', 'latency', 'buckets', 'queries', 'sql_time', 'bytes'
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.latency = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.queries = 0
+        self.sql_time = 0.0
+        self.bytes = 0
+
+
+class MetricsRegistry:
+    """Метрики запросов в памяти процесса.
+
+    Число рядов ограничено METRICS_MAX_SERIES: запросы сверх лимита
+    учитываются в общем ряду с view и route «other».
+    Каждый процесс-воркер хранит и отдает только свои метрики.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _get_series(self, labels):
+        if labels not in self._series and (
+            len(self._series) >= settings.METRICS_MAX_SERIES
+        ):
+            labels = (labels[0], 'other', 'other', labels[3])
+        if labels not in self._series:
+            self._series[labels] = Series()
+        return self._series[labels]
+
+    def observe(self, labels, latency, queries, sql_time, size):
+        """labels — (method, view, route, status)."""
+        with self._lock:
+            series = self._get_series(labels)
+            series.count += 1
+            series.latency += latency
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    series.buckets[index] += 1
+                    break
+            series.queries += queries
+            series.sql_time += sql_time
+            series.bytes += size
+
+    def add_bytes(self, labels, size):
+        with self._lock:
+            self._get_series(labels).bytes += size
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        with self._lock:
+            rows = [
+                (labels, series.count, series.latency,
+                 list(series.buckets), series.queries, series.sql_time,
+                 series.bytes)
+                for labels, series in sorted(self._series.items())
+            ]
+        lines = []
+        for name, kind, help_text, index in (
+            ('foodgram_http_requests_total', 'counter',
+             'Number of HTTP requests.', 1),
+            ('foodgram_http_sql_queries_total', 'counter',
+             'Number of SQL queries run by requests.', 4),
+            ('foodgram_http_sql_duration_seconds_total', 'counter',
+             'Time spent in SQL queries.', 5),
+            ('foodgram_http_response_bytes_total', 'counter',
+             'Size of response bodies.', 6),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(
+                f'{name}{{{format_labels(row[0])}}} {row[index]}'
+                for row in rows
+            )
+        name = 'foodgram_http_request_duration_seconds'
+        lines.append(f'# HELP {name} Request processing time.')
+        lines.append(f'# TYPE {name} histogram')
+        for labels, count, latency, buckets, *_ in rows:
+            labels = format_labels(labels)
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BUCKETS, buckets):
+                cumulative += bucket
+                lines.append(
+                    f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{{labels}}} {latency}')
+            lines.append(f'{name}_count{{{labels}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+def escape(value):
+    return (
+        str(value).replace('\\', '\\\\').replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+def format_labels(labels):
+    return ','.join(
+        f'{name}="{escape(value)}"'
+        for name, value in zip(('method', 'view', 'route', 'status'), labels)
+    )
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,117 @@
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .metrics import registry
+
+# Счетчик SQL-запросов текущего запроса. Контекстная переменная
+# переходит в потоки sync_to_async, поэтому учитываются и запросы,
+# выполненные асинхронными представлениями в пуле потоков.
+current_queries = ContextVar('current_queries', default=None)
+
+
+class QueryCounter:
+    """Число SQL-запросов и их суммарное время."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.duration = 0.0
+
+    def add(self, duration):
+        with self._lock:
+            self.count += 1
+            self.duration += duration
+
+
+def count_query(execute, sql, params, many, context):
+    """Обертка execute_wrapper, учитывающая запрос в текущем счетчике."""
+    queries = current_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries.add(time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class MetricsMiddleware:
+    """Собирает метрики запросов для /api/metrics/.
+    Работает и в синхронном, и в асинхронном стеке.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = current_queries.set(QueryCounter())
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            self.observe(request, response, started)
+        finally:
+            current_queries.reset(token)
+        return response
+
+    async def __acall__(self, request):
+        token = current_queries.set(QueryCounter())
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            self.observe(request, response, started)
+        finally:
+            current_queries.reset(token)
+        return response
+
+    def observe(self, request, response, started):
+        latency = time.perf_counter() - started
+        queries = current_queries.get()
+        labels = self.get_labels(request, response)
+        if response.streaming:
+            response.streaming_content = self.count_bytes(
+                labels, response.streaming_content
+            )
+            size = 0
+        else:
+            size = len(response.content)
+        registry.observe(
+            labels, latency, queries.count, queries.duration, size
+        )
+
+    @staticmethod
+    def get_labels(request, response):
+        match = request.resolver_match
+        return (
+            request.method,
+            match.view_name if match else '',
+            match.route if match else '<unmatched>',
+            f'{response.status_code // 100}xx',
+        )
+
+    @staticmethod
+    def count_bytes(labels, content):
+        size = 0
+        try:
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        finally:
+            registry.add_bytes(labels, size)
@@ -1,9 +1,23 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import quote_etag
+from recipes.cache import get_version
+from recipes.signals import bulk_created, bulk_deleted
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from .pagination import Pagination
+from .relations import invalidate_relation
+from .serializers import BulkIdsSerializer
 
 
 class PostDeleteMixin:
@@ -14,6 +28,7 @@ class PostDeleteMixin:
     serializer_class = None
     obj_model = None
     object_name = 'recipe'
+    relation_name = None
 
     def post(self, request, id):
         obj = get_object_or_404(
@@ -28,6 +43,7 @@ class PostDeleteMixin:
         )
         if serializer.is_valid(raise_exception=True):
             serializer.save()
+            invalidate_relation(request.user, self.relation_name)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
@@ -41,4 +57,148 @@ class PostDeleteMixin:
         }
         data = self.model_class.objects.filter(**query_param)
         data.delete()
+        invalidate_relation(request.user, self.relation_name)
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class BulkPostDeleteMixin:
+    """Миксин для массового создания и удаления связей по списку id.
+
+    Объекты проверяются одним запросом IN, связи создаются через
+    bulk_create и удаляются одним запросом. Для каждого id
+    возвращается результат.
+    """
+    permission_classes = [IsAuthenticated, ]
+
+    def get_ids(self, request):
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return list(dict.fromkeys(serializer.validated_data['ids']))
+
+    def get_links(self, request, ids):
+        """Блокирует пользователя до конца транзакции и возвращает
+        существующие объекты из ids и уже связанные с ним.
+        """
+        get_user_model().objects.select_for_update().get(pk=request.user.pk)
+        found = set(
+            self.obj_model.objects.filter(pk__in=ids).values_list(
+                'pk', flat=True
+            )
+        )
+        linked = set(
+            self.model_class.objects.filter(
+                user=request.user, **{f'{self.object_name}__in': found}
+            ).values_list(f'{self.object_name}_id', flat=True)
+        )
+        return found, linked
+
+    def delete_links(self, user, ids):
+        """Удаляет связи одним DELETE. QuerySet.delete() загрузил бы
+        объекты и отправил сигналы для каждого из них, поэтому запрос
+        выполняется напрямую, а побочные эффекты применяет bulk_deleted.
+        """
+        if not ids:
+            return
+        meta = self.model_class._meta
+        quote_name = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {quote_name(meta.db_table)} '
+                f'WHERE {quote_name(meta.get_field("user").column)} = %s '
+                f'AND {quote_name(meta.get_field(self.object_name).column)} '
+                f'IN ({", ".join(["%s"] * len(ids))})',
+                [user.id, *ids]
+            )
+
+    @staticmethod
+    def get_results(ids, statuses):
+        return Response({'results': [
+            {'id': pk, 'status': statuses.get(pk, 'not_found')}
+            for pk in ids
+        ]})
+
+    @transaction.atomic
+    def post(self, request):
+        ids = self.get_ids(request)
+        found, linked = self.get_links(request, ids)
+        added = [pk for pk in ids if pk in found and pk not in linked]
+        self.model_class.objects.bulk_create(
+            [
+                self.model_class(
+                    user=request.user, **{f'{self.object_name}_id': pk}
+                )
+                for pk in added
+            ],
+            ignore_conflicts=True
+        )
+        bulk_created(self.model_class, request.user.id, added)
+        transaction.on_commit(lambda: invalidate_relation(
+            request.user, self.relation_name
+        ))
+        statuses = dict.fromkeys(linked, 'exists')
+        statuses.update(dict.fromkeys(added, 'created'))
+        return self.get_results(ids, statuses)
+
+    @transaction.atomic
+    def delete(self, request):
+        ids = self.get_ids(request)
+        found, linked = self.get_links(request, ids)
+        removed = [pk for pk in ids if pk in linked]
+        self.delete_links(request.user, removed)
+        bulk_deleted(self.model_class, request.user.id, removed)
+        transaction.on_commit(lambda: invalidate_relation(
+            request.user, self.relation_name
+        ))
+        statuses = dict.fromkeys(found, 'not_linked')
+        statuses.update(dict.fromkeys(removed, 'deleted'))
+        return self.get_results(ids, statuses)
+
+
+class VersionedCacheMixin:
+    """Миксин для кэширования ответов list/retrieve справочных данных.
+
+    Готовые байты ответа хранятся в кэше Django по ключу с версией
+    данных cache_version_name и сбрасываются при ее увеличении.
+    Ответы содержат ETag и на If-None-Match отвечают 304.
+    """
+    cache_version_name = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        key = 'api:{}:{}:{}'.format(
+            self.cache_version_name,
+            get_version(self.cache_version_name),
+            request.get_full_path()
+        )
+        entry = cache.get(key)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            body = renderer.render(
+                response.data,
+                request.accepted_media_type,
+                self.get_renderer_context()
+            )
+            entry = (quote_etag(hashlib.md5(body).hexdigest()), body)
+            cache.set(key, entry, settings.REFERENCE_DATA_CACHE_TIMEOUT)
+        etag, body = entry
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(body, content_type=renderer.media_type)
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True, max_age=settings.REFERENCE_DATA_MAX_AGE
+        )
+        patch_vary_headers(response, ('Accept',))
+        return response
@@ -1,6 +1,203 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по ключу (курсору) без COUNT(*) и OFFSET.
+
+    Позиция страницы задается значениями полей ordering
+    последнего (или первого) объекта предыдущей страницы.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        self.current_ordering = self.get_ordering(queryset)
+        position, reverse = self.decode_cursor(request)
+        if position is not None:
+            position = self.parse_position(queryset, position)
+        ordering = self.current_ordering
+        if reverse:
+            ordering = tuple(self.invert(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(ordering, position))
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+        self.next_position = (
+            self.get_position(results[-1]) if has_next and results else None
+        )
+        self.previous_position = (
+            self.get_position(results[0])
+            if has_previous and results else None
+        )
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        """Порядок, заданный фильтром сортировки, или ordering по умолчанию.
+        Последнее поле порядка должно быть уникальным.
+        """
+        ordering = queryset.query.order_by
+        if ordering and all(isinstance(field, str) for field in ordering):
+            return tuple(ordering)
+        return self.ordering
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def keyset_filter(ordering, position):
+        """Условие «строка идет после position» для порядка ordering."""
+        condition = Q()
+        for index in reversed(range(len(ordering))):
+            field = ordering[index].lstrip('-')
+            lookup = 'lt' if ordering[index].startswith('-') else 'gt'
+            after = Q(**{f'{field}__{lookup}': position[index]})
+            if index < len(ordering) - 1:
+                after |= Q(**{field: position[index]}) & condition
+            condition = after
+        return condition
+
+    def get_position(self, obj):
+        """Значения полей порядка объекта или строки .values()."""
+        position = []
+        for field in self.current_ordering:
+            field = field.lstrip('-')
+            value = obj[field] if isinstance(obj, dict) else getattr(
+                obj, field
+            )
+            position.append(
+                value.isoformat() if hasattr(value, 'isoformat') else value
+            )
+        return position
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            position, reverse = data['p'], bool(data['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or (
+            len(position) != len(self.current_ordering)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def parse_position(self, queryset, position):
+        """Приводит значения курсора к типам полей порядка."""
+        values = []
+        for field, value in zip(self.current_ordering, position):
+            field = field.lstrip('-')
+            annotation = queryset.query.annotations.get(field)
+            try:
+                model_field = (
+                    annotation.output_field if annotation is not None
+                    else queryset.model._meta.get_field(field)
+                )
+                value = model_field.to_python(value)
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            values.append(value)
+        return values
+
+    def encode_cursor(self, position, reverse):
+        cursor = base64.urlsafe_b64encode(
+            json.dumps({'p': position, 'r': reverse}).encode()
+        ).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, cursor
+        )
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, False)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
 
 
 class Pagination(PageNumberPagination):
+    """Постраничная пагинация.
+
+    Если у представления задан keyset_pagination_class,
+    параметр ?pagination=cursor включает пагинацию по курсору.
+    """
     page_size = 6
     page_size_query_param = 'limit'
+    keyset_pagination_class = None
+
+    def use_keyset(self, request):
+        return self.keyset_pagination_class is not None and (
+            request.query_params.get('pagination') == 'cursor'
+            or self.keyset_pagination_class.cursor_query_param
+            in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_keyset(request):
+            self.keyset = self.keyset_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(Pagination):
+    keyset_pagination_class = KeysetPagination
+
+
+class AuthorKeysetPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class SubscriptionPagination(Pagination):
+    keyset_pagination_class = AuthorKeysetPagination
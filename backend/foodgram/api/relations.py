@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.cache import cache
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+RELATIONS = {
+    'favorites': (Favorite, 'recipe_id'),
+    'shopping_cart': (ShoppingCart, 'recipe_id'),
+    'following': (Subscription, 'following_id'),
+}
+RELATIONS_KEY = 'api:relations:{}:{}'
+
+
+def get_relations(request):
+    """Множества id избранных рецептов, рецептов в корзине и авторов,
+    на которых подписан пользователь. Загружаются один раз за запрос
+    и хранятся в кэше Django между запросами.
+    """
+    relations = getattr(request, '_user_relations', None)
+    if relations is not None:
+        return relations
+    user = request.user
+    if user.is_anonymous:
+        relations = {kind: frozenset() for kind in RELATIONS}
+    else:
+        keys = {
+            kind: RELATIONS_KEY.format(user.id, kind) for kind in RELATIONS
+        }
+        cached = cache.get_many(keys.values())
+        relations = {}
+        missing = {}
+        for kind, key in keys.items():
+            if key in cached:
+                relations[kind] = cached[key]
+            else:
+                relations[kind] = missing[key] = load_relation(user, kind)
+        if missing:
+            cache.set_many(missing, settings.RELATIONS_CACHE_TIMEOUT)
+    request._user_relations = relations
+    return relations
+
+
+def load_relation(user, kind):
+    model, field = RELATIONS[kind]
+    return frozenset(
+        model.objects.filter(user=user).values_list(field, flat=True)
+    )
+
+
+def invalidate_relation(user, kind):
+    """Сбрасывает закэшированное множество после изменения связей
+    в базе данных; get_relations загрузит его заново. Удаление ключа,
+    в отличие от чтения и записи множества, не теряет изменения
+    параллельных запросов.
+    """
+    cache.delete(RELATIONS_KEY.format(user.id, kind))
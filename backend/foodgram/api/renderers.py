@@ -0,0 +1,90 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class Echo:
+    """Псевдо-буфер: возвращает записанную строку вместо хранения."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListTextRenderer(BaseRenderer):
+    """Список покупок в виде текстового файла."""
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Ошибки (401, 404) — JSON, а не текст списка покупок.
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+    def stream(self, user, items):
+        yield f'Список покупок для {user.username} \n'
+        for item in items:
+            yield (f'{item["name"]} - {item["amount"]}'
+                   f'{item["measurement_unit"]} \n')
+
+
+class ShoppingListPDFRenderer(BaseRenderer):
+    """Список покупок в PDF. Сам PDF отрисовывается в фоне,
+    ответы о статусе отдаются в JSON.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        # Статус отрисовки и ошибки (401, 404) — JSON, а не PDF.
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return json.dumps(data, ensure_ascii=False).encode()
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Метрики в текстовом формате Prometheus."""
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+
+class ShoppingListCSVRenderer(ShoppingListTextRenderer):
+    """Список покупок в формате CSV."""
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, user, items):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for item in items:
+            yield writer.writerow((
+                item['name'], item['measurement_unit'], item['amount']
+            ))
+
+
+class ShoppingListJSONRenderer(JSONRenderer):
+    """Список покупок в формате JSON."""
+
+    def stream(self, user, items):
+        yield '['
+        for index, item in enumerate(items):
+            if index:
+                yield ','
+            yield json.dumps(item, ensure_ascii=False)
+        yield ']'
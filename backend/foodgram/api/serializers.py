@@ -1,11 +1,19 @@
-from django.shortcuts import get_object_or_404
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
+from recipes.images import schedule_derivatives
 from recipes.models import (Favorite, Ingredient, Recipe, RecipesIngredient,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingCartIngredient, Tag)
 from rest_framework import serializers
+from rest_framework.validators import UniqueTogetherValidator
 from users.models import CustomUser, Subscription
 
+from .fragments import cached_representations
+from .relations import get_relations
+
 
 class CustomUserSerializer(UserSerializer):
     """Сериализатор для отображения списка пользователей."""
@@ -22,13 +30,9 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Subscription.objects.filter(
-            user=user,
-            following=obj.id
-        ).exists()
+        return obj.id in get_relations(
+            self.context.get('request')
+        )['following']
 
 
 class CreateCustomUserSerializer(UserCreateSerializer):
@@ -47,7 +51,7 @@ class CreateCustomUserSerializer(UserCreateSerializer):
 class SubscriptionSerializer(CustomUserSerializer):
     """Сериализатор для отображения подписок."""
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta(CustomUserSerializer.Meta):
         fields = CustomUserSerializer.Meta.fields + (
@@ -61,18 +65,25 @@ class SubscriptionSerializer(CustomUserSerializer):
             'last_name'
         )
 
-    def get_recipes(self, obj):
-        request = self.context.get('request')
-        user = get_object_or_404(CustomUser, pk=obj.id)
-        recipes = user.recipes.all()
+    @staticmethod
+    def recipes_by_author(authors, request):
+        """Рецепты всех авторов страницы одним запросом."""
         recipes_limit = request.query_params.get('recipes_limit')
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
-        return ShortRecipeSerializer(recipes, many=True).data
+        recipes = defaultdict(list)
+        for recipe in Recipe.objects.latest_by_author(
+            [author.id for author in authors],
+            int(recipes_limit) if recipes_limit else None
+        ):
+            recipes[recipe.author_id].append(recipe)
+        return recipes
 
-    def get_recipes_count(self, obj):
-        user = get_object_or_404(CustomUser, pk=obj.id)
-        return user.recipes.count()
+    def get_recipes(self, obj):
+        recipes = self.context.get('recipes')
+        if recipes is None:
+            recipes = self.recipes_by_author(
+                [obj], self.context.get('request')
+            )
+        return ShortRecipeSerializer(recipes.get(obj.id, []), many=True).data
 
 
 class SubscribeSerializer(serializers.ModelSerializer):
@@ -80,12 +91,32 @@ class SubscribeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Subscription
         fields = ('user', 'following')
+        validators = [
+            UniqueTogetherValidator(
+                queryset=Subscription.objects.all(),
+                fields=('user', 'following'),
+                message='Вы уже подписаны на этого автора.'
+            )
+        ]
 
     def to_representation(self, instance):
-        return SubscriptionSerializer(
-            instance.following,
-            context={'request': self.context.get('request')}
-        ).data
+        request = self.context.get('request')
+        author = CustomUser.objects.get(pk=instance.following_id)
+        return SubscriptionSerializer(author, context={
+            'request': request,
+            'recipes': SubscriptionSerializer.recipes_by_author(
+                [author], request
+            )
+        }).data
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id для массового добавления и удаления."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_IDS
+    )
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -117,9 +148,44 @@ class RecipesIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class ImageVariantField(serializers.ImageField):
+    """URL производного изображения рецепта.
+    Пока оно не создано, возвращает URL исходного изображения.
+    """
+
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return super().to_representation(
+            getattr(recipe, self.variant) or recipe.image
+        )
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Список рецептов из кэша представлений одним запросом к кэшу."""
+
+    def to_representation(self, data):
+        recipes = list(data.all() if hasattr(data, 'all') else data)
+        by_id = {recipe.id: recipe for recipe in recipes}
+        return cached_representations(
+            [(recipe.id, recipe.author_id) for recipe in recipes],
+            self.context.get('request'),
+            lambda ids: {
+                recipe_id: self.child.build(by_id[recipe_id])
+                for recipe_id in ids
+            }
+        )
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для отображения списка рецептов."""
     image = Base64ImageField()
+    thumbnail = ImageVariantField('thumbnail')
+    image_webp = ImageVariantField('image_webp')
     author = CustomUserSerializer()
     tags = TagSerializer(many=True)
     is_favorited = serializers.SerializerMethodField()
@@ -132,29 +198,38 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = (
             'id', 'name', 'tags',
-            'text', 'image', 'author',
+            'text', 'image', 'thumbnail', 'image_webp', 'author',
             'cooking_time', 'is_favorited',
             'is_in_shopping_cart', 'ingredients'
         )
         read_only_fields = (
             'tags', 'author', 'is_favorited', 'is_in_shopping_cart'
         )
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        return cached_representations(
+            [(instance.id, instance.author_id)],
+            self.context.get('request'),
+            lambda ids: {instance.id: self.build(instance)}
+        )[0]
+
+    def build(self, instance):
+        return super().to_representation(instance)
 
     def get_ingredients(self, obj):
         ingredients = RecipesIngredient.objects.filter(recipe=obj.id)
         return RecipesIngredientSerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return user.favorites.filter(recipe=obj.id).exists()
+        return obj.id in get_relations(
+            self.context.get('request')
+        )['favorites']
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return user.shopping_cart.filter(recipe=obj.id).exists()
+        return obj.id in get_relations(
+            self.context.get('request')
+        )['shopping_cart']
 
 
 class AddRecipeSerializer(RecipeSerializer):
@@ -188,40 +263,96 @@ class AddRecipeSerializer(RecipeSerializer):
 
     @staticmethod
     def create_ingredients(ingredients, recipe):
-        for ingredient_data in ingredients:
-            RecipesIngredient.objects.create(
-                ingredient=ingredient_data.pop('id'),
-                amount=ingredient_data.pop('amount'),
+        RecipesIngredient.objects.bulk_create(
+            RecipesIngredient(
+                ingredient=ingredient_data['id'],
+                amount=ingredient_data['amount'],
                 recipe=recipe
             )
+            for ingredient_data in ingredients
+        )
 
+    @classmethod
+    def update_ingredients(cls, ingredients, recipe):
+        """Применяет к ингредиентам рецепта только изменившиеся строки.
+        Возвращает количества ингредиентов до и после изменения.
+        """
+        rows = {
+            row.ingredient_id: row
+            for row in RecipesIngredient.objects.filter(recipe=recipe)
+        }
+        old_amounts = {
+            ingredient_id: row.amount for ingredient_id, row in rows.items()
+        }
+        new_amounts = {
+            ingredient_data['id'].id: ingredient_data['amount']
+            for ingredient_data in ingredients
+        }
+        removed = old_amounts.keys() - new_amounts.keys()
+        if removed:
+            RecipesIngredient.objects.filter(
+                recipe=recipe, ingredient__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id in old_amounts.keys() & new_amounts.keys():
+            if old_amounts[ingredient_id] != new_amounts[ingredient_id]:
+                rows[ingredient_id].amount = new_amounts[ingredient_id]
+                changed.append(rows[ingredient_id])
+        if changed:
+            RecipesIngredient.objects.bulk_update(changed, ['amount'])
+        added = [
+            ingredient_data for ingredient_data in ingredients
+            if ingredient_data['id'].id not in old_amounts
+        ]
+        if added:
+            cls.create_ingredients(added, recipe)
+        return old_amounts, new_amounts
+
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe = Recipe.objects.create(author=author, **validated_data)
+        recipe = Recipe.objects.create(
+            author=author, tags_mask=Tag.mask_of(tags), **validated_data
+        )
         recipe.tags.set(tags)
         self.create_ingredients(ingredients, recipe)
+        schedule_derivatives(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        instance.ingredients.clear()
-        instance.tags.set(validated_data.pop('tags'))
-        ingredients = validated_data.pop('ingredients')
-        self.create_ingredients(ingredients, instance)
+        tags = validated_data.pop('tags', None)
+        if tags is not None:
+            instance.tags.set(tags)
+            validated_data['tags_mask'] = Tag.mask_of(tags)
+        ingredients = validated_data.pop('ingredients', None)
+        if ingredients is not None:
+            ShoppingCartIngredient.objects.change_recipe(
+                instance, *self.update_ingredients(ingredients, instance)
+            )
+        if 'image' in validated_data:
+            validated_data['thumbnail'] = ''
+            validated_data['image_webp'] = ''
+            schedule_derivatives(instance)
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        # Ответ собирается мимо кэша представлений: экземпляр в памяти
+        # может не совпадать с базой (например, превью изображения
+        # создаются в фоне), и фрагмент с ним жил бы весь срок кэша.
         return RecipeSerializer(
             instance, context={'request': self.context.get('request')}
-        ).data
+        ).build(instance)
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
+    thumbnail = ImageVariantField('thumbnail')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnail', 'cooking_time')
         read_only_fields = ('name', 'image', 'cooking_time')
 
 
@@ -231,6 +362,13 @@ class FavoriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Favorite
         fields = ('recipe', 'user')
+        validators = [
+            UniqueTogetherValidator(
+                queryset=Favorite.objects.all(),
+                fields=('user', 'recipe'),
+                message='Рецепт уже в избранном.'
+            )
+        ]
 
     def to_representation(self, instance):
         return ShortRecipeSerializer(instance.recipe).data
@@ -241,3 +379,10 @@ class ShoppingCartSerializer(FavoriteSerializer):
 
     class Meta(FavoriteSerializer.Meta):
         model = ShoppingCart
+        validators = [
+            UniqueTogetherValidator(
+                queryset=ShoppingCart.objects.all(),
+                fields=('user', 'recipe'),
+                message='Рецепт уже в списке покупок.'
+            )
+        ]
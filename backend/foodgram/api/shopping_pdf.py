@@ -0,0 +1,120 @@
+"""Список покупок в PDF.
+
+PDF создается в фоновом пуле потоков и хранится в кэше Django
+по хэшу содержимого списка, поэтому неизменившийся список
+не отрисовывается повторно.
+"""
+import hashlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+logger = logging.getLogger(__name__)
+
+PDF_KEY = 'api:shopping-pdf:{}:{}'
+PENDING_KEY = 'api:shopping-pdf:{}:{}:pending'
+FONT_NAME = 'ShoppingListFont'
+MARGIN = 20 * mm
+LINE_HEIGHT = 7 * mm
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    return ThreadPoolExecutor(
+        max_workers=settings.SHOPPING_LIST_PDF_WORKERS,
+        thread_name_prefix='shopping-pdf'
+    )
+
+
+@lru_cache(maxsize=None)
+def register_font():
+    pdfmetrics.registerFont(
+        TTFont(FONT_NAME, settings.SHOPPING_LIST_PDF_FONT)
+    )
+
+
+def get_digest(user, items):
+    """Хэш содержимого списка покупок пользователя."""
+    return hashlib.sha256(json.dumps(
+        [user.username, items], ensure_ascii=False
+    ).encode()).hexdigest()
+
+
+def get_pdf(user, digest):
+    return cache.get(PDF_KEY.format(user.id, digest))
+
+
+def is_pending(user, digest):
+    return cache.get(PENDING_KEY.format(user.id, digest)) is not None
+
+
+def render(username, items):
+    register_font()
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4, invariant=True)
+    width, height = A4
+    y = height - MARGIN
+    pdf.setFont(FONT_NAME, 16)
+    pdf.drawString(MARGIN, y, f'Список покупок для {username}')
+    y -= 2 * LINE_HEIGHT
+    pdf.setFont(FONT_NAME, 12)
+    for item in items:
+        if y < MARGIN:
+            pdf.showPage()
+            pdf.setFont(FONT_NAME, 12)
+            y = height - MARGIN
+        pdf.drawString(MARGIN, y, '☐ {} — {} {}'.format(
+            item['name'], item['amount'], item['measurement_unit']
+        ))
+        y -= LINE_HEIGHT
+    pdf.save()
+    return buffer.getvalue()
+
+
+def build(user_id, username, digest, items):
+    try:
+        cache.set(
+            PDF_KEY.format(user_id, digest),
+            render(username, items),
+            settings.SHOPPING_LIST_PDF_CACHE_TIMEOUT
+        )
+    except Exception:
+        logger.exception('Failed to render shopping list %s', digest)
+    finally:
+        cache.delete(PENDING_KEY.format(user_id, digest))
+
+
+def _run(*args):
+    try:
+        build(*args)
+    finally:
+        connection.close()
+
+
+def schedule(user, digest, items):
+    """Ставит отрисовку PDF в очередь, если она еще не запущена.
+    Без рабочих потоков PDF отрисовывается сразу.
+    """
+    if not cache.add(
+        PENDING_KEY.format(user.id, digest), True,
+        settings.SHOPPING_LIST_PDF_PENDING_TIMEOUT
+    ):
+        return
+    if get_pdf(user, digest) is not None:
+        cache.delete(PENDING_KEY.format(user.id, digest))
+        return
+    if not settings.SHOPPING_LIST_PDF_WORKERS:
+        build(user.id, user.username, digest, items)
+        return
+    get_executor().submit(_run, user.id, user.username, digest, items)
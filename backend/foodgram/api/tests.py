@@ -0,0 +1,575 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import F
+from django.test import Client, TestCase, override_settings
+from recipes.models import (CacheVersion, Favorite, Ingredient, Recipe,
+                            RecipesIngredient, RecipesTag, ShoppingCart,
+                            ShoppingCartIngredient, Tag)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import CustomUser, Subscription
+
+from .authentication import CachedTokenAuthentication, local_tokens
+from .serializers import RecipeSerializer
+
+RECIPES_COUNT = 24
+PAGE_SIZES = (1, 6, 20)
+
+
+class RecipeDataMixin:
+    """Пользователи, теги, ингредиенты и рецепты с избранным,
+    корзиной и подписками.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            CustomUser.objects.create_user(
+                email=f'user{index}@example.com', username=f'user{index}',
+                first_name='Имя', last_name='Фамилия', password='password'
+            )
+            for index in range(3)
+        ]
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {index}', color=f'#00000{index}', slug=f'tag{index}'
+            )
+            for index in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {index}', measurement_unit='г'
+            )
+            for index in range(5)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.users[index % 3],
+                name=f'Рецепт {index}',
+                text='Описание рецепта',
+                cooking_time=10 + index,
+                image='recipes_images/recipe.png',
+                tags_mask=Tag.mask_of([cls.tags[index % 3]]),
+            )
+            for index in range(RECIPES_COUNT)
+        ]
+        RecipesTag.objects.bulk_create(
+            RecipesTag(recipe=recipe, tag=cls.tags[index % 3])
+            for index, recipe in enumerate(cls.recipes)
+        )
+        RecipesIngredient.objects.bulk_create(
+            RecipesIngredient(
+                recipe=recipe, ingredient=ingredient, amount=100
+            )
+            for index, recipe in enumerate(cls.recipes)
+            for ingredient in cls.ingredients[:index % 4 + 1]
+        )
+        cls.user = cls.users[0]
+        for recipe in cls.recipes[::2]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+        for recipe in cls.recipes[::3]:
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Subscription.objects.create(user=cls.user, following=cls.users[1])
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_counters_consistent(self):
+        call_command('reconcile_counters', check=True, stdout=StringIO())
+
+    def assert_shopping_lists_consistent(self):
+        """Списки покупок совпадают с пересчитанными по корзинам."""
+        self.assertEqual(
+            sorted(ShoppingCartIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount', 'recipe_count'
+            )),
+            sorted(
+                (row['user_id'], row['ingredient_id'], row['total_amount'],
+                 row['recipe_count'])
+                for row in ShoppingCartIngredient.objects.calculate()
+            )
+        )
+
+
+class RecipeQueriesTest(RecipeDataMixin, TestCase):
+    """Число запросов к базе не зависит от размера страницы."""
+
+    # COUNT(*), рецепты с авторами, теги, ингредиенты.
+    LIST_QUERIES = 4
+    # Избранное, корзина и подписки пользователя.
+    RELATIONS_QUERIES = 3
+    # Версии кэша представлений: в тестах кэш LocMemCache,
+    # поэтому версии читаются из базы (см. recipes.cache).
+    VERSION_QUERIES = 1
+
+    def test_list_queries(self):
+        for client, queries in (
+            (self.anonymous, self.LIST_QUERIES + self.VERSION_QUERIES),
+            (self.client, self.LIST_QUERIES + self.VERSION_QUERIES
+             + self.RELATIONS_QUERIES),
+        ):
+            for page_size in PAGE_SIZES:
+                with self.subTest(
+                    user=client is self.client, page_size=page_size
+                ):
+                    cache.clear()
+                    with self.assertNumQueries(queries):
+                        response = client.get(
+                            f'/api/recipes/?limit={page_size}'
+                        )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.data['results']), min(
+                        page_size, RECIPES_COUNT
+                    ))
+
+    def test_cursor_list_queries(self):
+        for page_size in PAGE_SIZES:
+            with self.subTest(page_size=page_size):
+                cache.clear()
+                with self.assertNumQueries(
+                    self.LIST_QUERIES - 1 + self.VERSION_QUERIES
+                    + self.RELATIONS_QUERIES
+                ):
+                    response = self.client.get(
+                        f'/api/recipes/?limit={page_size}&pagination=cursor'
+                    )
+                self.assertEqual(response.status_code, 200)
+
+    def test_invalid_cursor(self):
+        next_page = self.client.get(
+            '/api/recipes/?pagination=cursor&limit=6'
+        ).data['next']
+        response = self.client.get(next_page)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 6)
+        for cursor in (
+            'eyJwIjpbIngiLCJ5Il0sInIiOmZhbHNlfQ==',
+            'eyJwIjpbbnVsbCwgMV0sICJyIjogZmFsc2V9',
+            'eyJwIjpbWzFdLCB7fV0sICJyIjogZmFsc2V9',
+            'not-base64',
+        ):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    f'/api/recipes/?pagination=cursor&cursor={cursor}'
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_detail_queries(self):
+        recipe = self.recipes[-1]
+        for client, queries in (
+            (self.anonymous, self.LIST_QUERIES - 1 + self.VERSION_QUERIES),
+            (self.client, self.LIST_QUERIES - 1 + self.VERSION_QUERIES
+             + self.RELATIONS_QUERIES),
+        ):
+            with self.subTest(user=client is self.client):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    response = client.get(f'/api/recipes/{recipe.id}/')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    len(response.data['ingredients']),
+                    recipe.ingredientsinrecipe.count()
+                )
+
+    def test_cached_detail(self):
+        """Повторный запрос рецепта собирается из кэша представлений."""
+        url = f'/api/recipes/{self.recipes[0].id}/'
+        first = self.client.get(url)
+        with patch.object(
+            RecipeSerializer, 'build', side_effect=AssertionError
+        ):
+            second = self.client.get(url)
+        self.assertEqual(first.content, second.content)
+
+    def test_cached_relations_queries(self):
+        """Связи пользователя при повторном запросе берутся из кэша."""
+        self.client.get('/api/recipes/?limit=6')
+        with self.assertNumQueries(
+            self.LIST_QUERIES + self.VERSION_QUERIES
+        ):
+            response = self.client.get('/api/recipes/?limit=6')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(RECIPE_FRAGMENT_CACHE_TIMEOUT=0)
+class FastRecipeSerializerTest(RecipeDataMixin, TestCase):
+    """FastRecipeSerializer отдает те же байты, что и RecipeSerializer."""
+
+    def test_same_json(self):
+        urls = (
+            '/api/recipes/?limit=20',
+            '/api/recipes/?limit=20&page=2',
+            '/api/recipes/?limit=6&pagination=cursor',
+            f'/api/recipes/{self.recipes[0].id}/',
+            f'/api/recipes/{self.recipes[-1].id}/',
+        )
+        for client, urls in (
+            (self.anonymous, urls),
+            (self.client, urls + ('/api/recipes/?is_favorited=1',)),
+        ):
+            for url in urls:
+                with self.subTest(user=client is self.client, url=url):
+                    responses = []
+                    for enabled in (False, True):
+                        with override_settings(
+                            FAST_RECIPE_SERIALIZER=enabled
+                        ):
+                            responses.append(client.get(url))
+                    self.assertEqual(responses[0].status_code, 200)
+                    self.assertEqual(
+                        responses[0].content, responses[1].content
+                    )
+
+
+class QueryPlansTest(RecipeDataMixin, TestCase):
+    """Запросы представлений используют индексы (см. check_query_plans)."""
+
+    def test_query_plans(self):
+        output = StringIO()
+        call_command(
+            'check_query_plans', user=self.user.id,
+            recipe=self.recipes[0].id, stdout=output
+        )
+        self.assertIn('All queries use indexes', output.getvalue())
+
+
+class CountersTest(RecipeDataMixin, TestCase):
+    """Сохранение пользователя или рецепта не затирает счетчики."""
+
+    def test_user_save_keeps_followers_count(self):
+        author = CustomUser.objects.get(pk=self.users[2].id)
+        response = self.client.post(f'/api/users/{author.id}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        author.is_staff = True
+        author.save()
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 1)
+        self.assertTrue(author.is_staff)
+        self.assert_counters_consistent()
+
+    def test_profile_edit_keeps_followers_count(self):
+        author = self.users[2]
+        author_client = APIClient()
+        author_client.force_authenticate(author)
+        self.client.post(f'/api/users/{author.id}/subscribe/')
+        response = author_client.patch(
+            '/api/users/me/', {'first_name': 'Новое'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        author.refresh_from_db()
+        self.assertEqual(author.first_name, 'Новое')
+        self.assertEqual(author.followers_count, 1)
+        self.assert_counters_consistent()
+
+    def test_recipe_edit_keeps_favorites_count(self):
+        recipe = self.recipes[1]
+        author_client = APIClient()
+        author_client.force_authenticate(recipe.author)
+        response = self.client.post(f'/api/recipes/{recipe.id}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        response = author_client.patch(
+            f'/api/recipes/{recipe.id}/', {'name': 'Новое'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assert_counters_consistent()
+
+
+class BulkEndpointsTest(RecipeDataMixin, TestCase):
+    """Пакетные добавление и удаление связей: статусы по каждому id,
+    счетчики и списки покупок после запроса.
+    """
+    MISSING_ID = 10 ** 6
+
+    def bulk(self, method, url, ids):
+        response = getattr(self.client, method)(
+            url, {'ids': ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return [
+            (result['id'], result['status'])
+            for result in response.data['results']
+        ]
+
+    def check_bulk(self, url, linked, unlinked, counter):
+        ids = [linked.id, unlinked.id, self.MISSING_ID]
+        self.assertEqual(self.bulk('post', url, ids), [
+            (linked.id, 'exists'),
+            (unlinked.id, 'created'),
+            (self.MISSING_ID, 'not_found'),
+        ])
+        for instance in (linked, unlinked):
+            instance.refresh_from_db()
+            self.assertEqual(getattr(instance, counter), 1)
+        self.assert_counters_consistent()
+        self.assert_shopping_lists_consistent()
+
+        self.assertEqual(self.bulk('delete', url, ids), [
+            (linked.id, 'deleted'),
+            (unlinked.id, 'deleted'),
+            (self.MISSING_ID, 'not_found'),
+        ])
+        self.assertEqual(self.bulk('delete', url, [linked.id]), [
+            (linked.id, 'not_linked'),
+        ])
+        for instance in (linked, unlinked):
+            instance.refresh_from_db()
+            self.assertEqual(getattr(instance, counter), 0)
+        self.assert_counters_consistent()
+        self.assert_shopping_lists_consistent()
+
+    def test_shopping_cart(self):
+        self.check_bulk(
+            '/api/recipes/shopping_cart/',
+            self.recipes[0], self.recipes[1], 'in_carts_count'
+        )
+
+    def test_favorite(self):
+        self.check_bulk(
+            '/api/recipes/favorite/',
+            self.recipes[0], self.recipes[1], 'favorites_count'
+        )
+
+    def test_subscribe(self):
+        self.check_bulk(
+            '/api/users/subscribe/',
+            self.users[1], self.users[2], 'followers_count'
+        )
+
+
+class ShoppingListTest(RecipeDataMixin, TestCase):
+    """Список покупок обновляется при изменении корзины
+    и ингредиентов рецептов в корзине.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.buyer = self.users[2]
+        self.buyer_client = APIClient()
+        self.buyer_client.force_authenticate(self.buyer)
+
+    def get_totals(self):
+        return {
+            ingredient_id: (total_amount, recipe_count)
+            for ingredient_id, total_amount, recipe_count
+            in ShoppingCartIngredient.objects.filter(
+                user=self.buyer
+            ).values_list('ingredient_id', 'total_amount', 'recipe_count')
+        }
+
+    def add_to_cart(self, recipe):
+        response = self.buyer_client.post(
+            f'/api/recipes/{recipe.id}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_add_and_remove_recipe(self):
+        first, second = self.recipes[1], self.recipes[2]
+        self.add_to_cart(first)
+        self.add_to_cart(second)
+        ingredients = [ingredient.id for ingredient in self.ingredients]
+        self.assertEqual(self.get_totals(), {
+            ingredients[0]: (200, 2),
+            ingredients[1]: (200, 2),
+            ingredients[2]: (100, 1),
+        })
+        response = self.buyer_client.delete(
+            f'/api/recipes/{first.id}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_totals(), {
+            ingredients[0]: (100, 1),
+            ingredients[1]: (100, 1),
+            ingredients[2]: (100, 1),
+        })
+        self.assert_shopping_lists_consistent()
+
+    def test_api_recipe_update(self):
+        recipe = self.recipes[1]
+        self.add_to_cart(recipe)
+        author_client = APIClient()
+        author_client.force_authenticate(recipe.author)
+        response = author_client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {'ingredients': [
+                {'id': self.ingredients[0].id, 'amount': 30},
+                {'id': self.ingredients[3].id, 'amount': 7},
+            ]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_totals(), {
+            self.ingredients[0].id: (30, 1),
+            self.ingredients[3].id: (7, 1),
+        })
+        self.assert_shopping_lists_consistent()
+
+    def test_admin_recipe_update(self):
+        recipe = self.recipes[1]
+        self.add_to_cart(recipe)
+        admin = CustomUser.objects.create_superuser(
+            email='admin@example.com', username='admin',
+            first_name='Имя', last_name='Фамилия', password='password'
+        )
+        admin_client = Client()
+        admin_client.force_login(admin)
+        kept, deleted = recipe.ingredientsinrecipe.order_by('id')
+        data = {
+            'author': recipe.author_id,
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'ingredientsinrecipe-TOTAL_FORMS': 3,
+            'ingredientsinrecipe-INITIAL_FORMS': 2,
+            'ingredientsinrecipe-0-id': kept.id,
+            'ingredientsinrecipe-0-recipe': recipe.id,
+            'ingredientsinrecipe-0-ingredient': kept.ingredient_id,
+            'ingredientsinrecipe-0-amount': 30,
+            'ingredientsinrecipe-1-id': deleted.id,
+            'ingredientsinrecipe-1-recipe': recipe.id,
+            'ingredientsinrecipe-1-ingredient': deleted.ingredient_id,
+            'ingredientsinrecipe-1-amount': deleted.amount,
+            'ingredientsinrecipe-1-DELETE': 'on',
+            'ingredientsinrecipe-2-recipe': recipe.id,
+            'ingredientsinrecipe-2-ingredient': self.ingredients[4].id,
+            'ingredientsinrecipe-2-amount': 7,
+            'recipestag_set-TOTAL_FORMS': 0,
+            'recipestag_set-INITIAL_FORMS': 0,
+        }
+        response = admin_client.post(
+            f'/admin/recipes/recipe/{recipe.id}/change/', data
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.get_totals(), {
+            kept.ingredient_id: (30, 1),
+            self.ingredients[4].id: (7, 1),
+        })
+        self.assert_shopping_lists_consistent()
+
+    def test_unit_conversion(self):
+        """Количества в совместимых единицах складываются
+        в основной единице.
+        """
+        units = {
+            ('Мука', 'кг'): 1, ('Мука', 'г'): 500,
+            ('Молоко', 'ст. л.'): 2, ('Молоко', 'мл'): 100,
+            ('Яблоко', 'шт.'): 3,
+        }
+        for index, ((name, unit), amount) in enumerate(units.items()):
+            recipe = self.recipes[index]
+            RecipesIngredient.objects.create(
+                recipe=recipe,
+                ingredient=Ingredient.objects.create(
+                    name=name, measurement_unit=unit
+                ),
+                amount=amount
+            )
+            recipe.ingredientsinrecipe.exclude(
+                ingredient__name=name
+            ).delete()
+            self.add_to_cart(recipe)
+        self.assertEqual(
+            list(ShoppingCartIngredient.objects.shopping_list(self.buyer)),
+            [
+                {'name': 'Молоко', 'measurement_unit': 'мл', 'amount': 130},
+                {'name': 'Мука', 'measurement_unit': 'г', 'amount': 1500},
+                {'name': 'Яблоко', 'measurement_unit': 'шт.', 'amount': 3},
+            ]
+        )
+        response = self.buyer_client.get(
+            '/api/recipes/download_shopping_cart/?format=txt'
+        )
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('Мука - 1500г', content)
+        self.assertIn('Молоко - 130мл', content)
+
+
+class CacheVersionTest(TestCase):
+    """С кэшем в памяти процесса версии хранятся в базе, и увеличение
+    версии в другом процессе (manage.py load_data) сбрасывает кэш.
+    """
+
+    def test_version_survives_local_cache(self):
+        response = self.client.get('/api/ingredients/')
+        self.assertEqual(response.json(), [])
+        # Другой процесс: добавляет ингредиенты и увеличивает версию,
+        # не затрагивая кэш этого процесса.
+        Ingredient.objects.bulk_create([
+            Ingredient(name='Соль', measurement_unit='г')
+        ])
+        CacheVersion.objects.bulk_create(
+            [CacheVersion(name='ingredients')], ignore_conflicts=True
+        )
+        CacheVersion.objects.filter(name='ingredients').update(
+            version=F('version') + 1
+        )
+        response = self.client.get('/api/ingredients/?name=со')
+        self.assertEqual(
+            [ingredient['name'] for ingredient in response.json()], ['Соль']
+        )
+        response = self.client.get('/api/ingredients/')
+        self.assertEqual(len(response.json()), 1)
+
+
+@override_settings(TOKEN_LOCAL_CACHE_TIMEOUT=60)
+class TokenCacheTest(RecipeDataMixin, TestCase):
+    """Кэш токенов в памяти процесса работает без общего кэша."""
+
+    def setUp(self):
+        super().setUp()
+        local_tokens.clear()
+        self.addCleanup(local_tokens.clear)
+        self.token = Token.objects.create(user=self.users[2])
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_token(self):
+        self.client.get('/api/tags/')
+        # Остается только чтение версии кэша тегов, как у анонима.
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_deleted_token(self):
+        self.client.get('/api/tags/')
+        self.token.delete()
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_cached_user_save_keeps_counters(self):
+        self.client.get('/api/tags/')
+        author = self.users[2]
+        Subscription.objects.create(user=self.user, following=author)
+        user, _ = CachedTokenAuthentication().authenticate_credentials(
+            self.token.key
+        )
+        user.first_name = 'Новое'
+        user.save()
+        author.refresh_from_db()
+        self.assertEqual(author.first_name, 'Новое')
+        self.assertEqual(author.followers_count, 1)
+
+
+class ShoppingListDownloadTest(RecipeDataMixin, TestCase):
+    """Ошибки скачивания списка покупок отдаются в JSON."""
+
+    def test_unauthorized(self):
+        for format in ('txt', 'csv', 'pdf'):
+            with self.subTest(format=format):
+                response = self.anonymous.get(
+                    f'/api/recipes/download_shopping_cart/?format={format}'
+                )
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(
+                    response['Content-Type'], 'application/json'
+                )
+                self.assertIn('detail', response.json())
@@ -3,9 +3,10 @@ from django.conf.urls.static import static
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (CustomUserViewSet, FavoriteView, IngredientViewSet,
+from .views import (BulkFavoriteView, BulkShoppingCartView, BulkSubscribeView,
+                    CustomUserViewSet, FavoriteView, IngredientViewSet,
                     RecipeViewSet, ShoppingCartView, SubscribeView, TagViewSet,
-                    download_shopping_cart)
+                    download_shopping_cart, metrics, shopping_cart_pdf)
 
 router = DefaultRouter()
 router.register('tags', TagViewSet, basename='tags')
@@ -15,11 +16,32 @@ router.register('users', CustomUserViewSet, basename='users')
 
 
 urlpatterns = [
+    path('metrics/', metrics, name='metrics'),
     path(
         'recipes/download_shopping_cart/',
         download_shopping_cart,
         name='download_shopping_cart'
     ),
+    path(
+        'recipes/download_shopping_cart/<slug:digest>/',
+        shopping_cart_pdf,
+        name='shopping_cart_pdf'
+    ),
+    path(
+        'recipes/shopping_cart/',
+        BulkShoppingCartView.as_view(),
+        name='shopping_cart_bulk'
+    ),
+    path(
+        'recipes/favorite/',
+        BulkFavoriteView.as_view(),
+        name='favorite_bulk'
+    ),
+    path(
+        'users/subscribe/',
+        BulkSubscribeView.as_view(),
+        name='subscribe_bulk'
+    ),
     path('recipes/<int:id>/shopping_cart/',
          ShoppingCartView.as_view(),
          name='shopping_cart'),
@@ -38,6 +60,31 @@ urlpatterns = [
     path('', include('djoser.urls'))
 ]
 
+if settings.ASYNC_VIEWS:
+    from . import async_views
+
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list, name='recipes-list'),
+        path(
+            'recipes/<int:pk>/', async_views.recipe_detail,
+            name='recipes-detail'
+        ),
+        path('tags/', async_views.tag_list, name='tags-list'),
+        path('tags/<int:pk>/', async_views.tag_detail, name='tags-detail'),
+        path(
+            'ingredients/', async_views.ingredient_list,
+            name='ingredients-list'
+        ),
+        path(
+            'ingredients/<int:pk>/', async_views.ingredient_detail,
+            name='ingredients-detail'
+        ),
+        path(
+            'users/subscriptions/', async_views.subscriptions,
+            name='users-subscriptions'
+        ),
+    ] + urlpatterns
+
 if settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
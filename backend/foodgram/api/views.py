@@ -1,18 +1,34 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+import hashlib
+import json
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from recipes.models import (Favorite, Ingredient, Recipe, RecipesIngredient,
-                            ShoppingCart, Tag)
-from rest_framework import views, viewsets
-from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingCartIngredient, Tag)
+from rest_framework import status, views, viewsets
+from rest_framework.decorators import (action, api_view, permission_classes,
+                                       renderer_classes)
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
 from users.models import CustomUser, Subscription
 
-from .filters import IngredientSearchFilter, RecipeFilter
-from .mixins import PostDeleteMixin
-from .pagination import Pagination
+from . import shopping_pdf
+from .fast_serializers import RECIPE_VALUES, FastRecipeSerializer
+from .filters import (IngredientSearchFilter, RecipeFilter,
+                      RecipeOrderingFilter, RecipeSearchFilter)
+from .metrics import registry
+from .mixins import BulkPostDeleteMixin, PostDeleteMixin, VersionedCacheMixin
+from .pagination import RecipePagination, SubscriptionPagination
 from .permissions import IsAuthorOrAdminOrReadOnly
+from .renderers import (PrometheusRenderer, ShoppingListCSVRenderer,
+                        ShoppingListJSONRenderer, ShoppingListPDFRenderer,
+                        ShoppingListTextRenderer)
 from .serializers import (AddRecipeSerializer, CustomUserSerializer,
                           FavoriteSerializer, IngredientSerializer,
                           RecipeSerializer, ShoppingCartSerializer,
@@ -22,39 +38,107 @@ from .serializers import (AddRecipeSerializer, CustomUserSerializer,
 
 @api_view(http_method_names=['GET', ])
 @permission_classes([IsAuthenticated, ])
+@renderer_classes([
+    ShoppingListTextRenderer,
+    ShoppingListCSVRenderer,
+    ShoppingListJSONRenderer,
+    ShoppingListPDFRenderer
+])
 def download_shopping_cart(request):
     """Функция для скачивания списка ингредиентов
-       из всех добавленых в список покупок рецептов."""
-    shopping_cart = ShoppingCart.objects.filter(user=request.user)
-    recipes = [item.recipe.id for item in shopping_cart]
-    purchase_list = RecipesIngredient.objects.filter(
-        recipe__in=recipes
-    ).values(
-        'ingredient'
-    ).annotate(ingredients_amount=Sum('amount'))
-
-    text_file = f'Список покупок для {request.user.username} \n'
-    for item in purchase_list:
-        ingredient_id = item.get('ingredient')
-        amount = item.get('ingredients_amount')
-        ingredient = Ingredient.objects.get(pk=ingredient_id)
-        text_file += (f'{ingredient.name} - {amount}'
-                      f'{ingredient.measurement_unit} \n')
-
-    response = HttpResponse(text_file, content_type='text.txt')
-    response['Content-Disposition'] = ('attachment;'
-                                       'filename="purchase_list.txt"')
+       из всех добавленых в список покупок рецептов.
+       Формат файла выбирается параметром ?format=txt|csv|json|pdf."""
+    purchase_list = list(
+        ShoppingCartIngredient.objects.shopping_list(request.user)
+    )
+
+    renderer = request.accepted_renderer
+    if renderer.format == 'pdf':
+        digest = shopping_pdf.get_digest(request.user, purchase_list)
+        not_modified = get_conditional_response(
+            request, etag=quote_etag(digest)
+        )
+        if not_modified is not None:
+            return not_modified
+        shopping_pdf.schedule(request.user, digest, purchase_list)
+        return shopping_list_pdf_response(request, digest)
+
+    etag = hashlib.md5(json.dumps(
+        [request.user.username, renderer.format, purchase_list],
+        ensure_ascii=False
+    ).encode()).hexdigest()
+    not_modified = get_conditional_response(request, etag=quote_etag(etag))
+    if not_modified is not None:
+        return not_modified
+
+    response = StreamingHttpResponse(
+        renderer.stream(request.user, purchase_list),
+        content_type=(f'{renderer.media_type}; charset=utf-8')
+    )
+    response['ETag'] = quote_etag(etag)
+    response['Content-Disposition'] = (
+        f'attachment; filename="purchase_list.{renderer.format}"'
+    )
+    return response
+
+
+@api_view(http_method_names=['GET', ])
+@permission_classes([IsAuthenticated, ])
+def shopping_cart_pdf(request, digest):
+    """Статус фоновой отрисовки PDF или готовый файл."""
+    response = shopping_list_pdf_response(request, digest)
+    if response is None:
+        raise NotFound('Список покупок не найден, запросите его заново.')
     return response
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+def shopping_list_pdf_response(request, digest):
+    """Готовый PDF, ответ 202 со ссылкой для опроса, пока он
+    отрисовывается, или None, если его нет.
+    """
+    pdf = shopping_pdf.get_pdf(request.user, digest)
+    if pdf is not None:
+        response = HttpResponse(pdf, content_type='application/pdf')
+        response['ETag'] = quote_etag(digest)
+        response['Content-Disposition'] = (
+            'attachment; filename="purchase_list.pdf"'
+        )
+        return response
+    if not shopping_pdf.is_pending(request.user, digest):
+        return None
+    url = request.build_absolute_uri(
+        reverse('shopping_cart_pdf', args=[digest])
+    )
+    return Response(
+        {'status': 'pending', 'url': url},
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Location': url, 'Retry-After': '1'},
+        content_type='application/json'
+    )
+
+
+@api_view(http_method_names=['GET', ])
+@permission_classes([IsAdminUser, ])
+@renderer_classes([PrometheusRenderer, ])
+def metrics(request):
+    """Метрики запросов текущего воркера для Prometheus."""
+    return Response(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+class TagViewSet(VersionedCacheMixin, viewsets.ReadOnlyModelViewSet):
     """Возвращает список тегов/конкретный тег."""
+    cache_version_name = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(VersionedCacheMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """Возвращает список ингредиентов/конкретный ингредиент."""
+    cache_version_name = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (IngredientSearchFilter,)
@@ -63,15 +147,34 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """Вывод работы с рецептами."""
-    queryset = Recipe.objects.all()
-    pagination_class = Pagination
-    filter_backends = [DjangoFilterBackend, ]
+    pagination_class = RecipePagination
+    filter_backends = [
+        DjangoFilterBackend, RecipeSearchFilter, RecipeOrderingFilter
+    ]
     filterset_class = RecipeFilter
-    search_fields = ('^name', )
+    ordering_fields = ('pub_date', 'favorites_count', 'in_carts_count')
     permission_classes = (IsAuthorOrAdminOrReadOnly, )
 
+    def use_fast_serializer(self):
+        """Быстрая сериализация включена для JSON-ответов list/retrieve."""
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        return (
+            settings.FAST_RECIPE_SERIALIZER
+            and self.action in ('list', 'retrieve')
+            and renderer is not None and renderer.format == 'json'
+        )
+
+    def get_queryset(self):
+        if self.use_fast_serializer():
+            return Recipe.objects.values(*RECIPE_VALUES)
+        if self.action in ('list', 'retrieve'):
+            return Recipe.objects.with_related()
+        return Recipe.objects.all()
+
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.use_fast_serializer():
+            return FastRecipeSerializer
+        if self.action in ('list', 'retrieve'):
             return RecipeSerializer
         return AddRecipeSerializer
 
@@ -80,16 +183,24 @@ class CustomUserViewSet(UserViewSet):
     """Отображение работы с пользователями."""
     queryset = CustomUser.objects.all()
     serializer_class = CustomUserSerializer
-    pagination_class = Pagination
+    pagination_class = SubscriptionPagination
+
+    @staticmethod
+    def subscribed_authors(request):
+        return CustomUser.objects.filter(
+            followers__user=request.user
+        ).order_by('id')
 
     @action(detail=False, methods=['get'],
             permission_classes=[IsAuthenticated, ])
     def subscriptions(self, request):
-        queryset = CustomUser.objects.filter(followers__user=request.user)
-        pages = self.paginate_queryset(queryset)
-        serializer = SubscriptionSerializer(
-            pages, many=True, context={'request': request}
-        )
+        pages = self.paginate_queryset(self.subscribed_authors(request))
+        serializer = SubscriptionSerializer(pages, many=True, context={
+            'request': request,
+            'recipes': SubscriptionSerializer.recipes_by_author(
+                pages, request
+            )
+        })
         return self.get_paginated_response(serializer.data)
 
 
@@ -99,6 +210,7 @@ class SubscribeView(PostDeleteMixin, views.APIView):
     serializer_class = SubscribeSerializer
     obj_model = CustomUser
     object_name = 'following'
+    relation_name = 'following'
 
 
 class FavoriteView(PostDeleteMixin, views.APIView):
@@ -107,9 +219,23 @@ class FavoriteView(PostDeleteMixin, views.APIView):
     serializer_class = FavoriteSerializer
     obj_model = Recipe
     object_name = 'recipe'
+    relation_name = 'favorites'
 
 
 class ShoppingCartView(FavoriteView):
     """Добавление/удаление рецепта из списка покупок."""
     model_class = ShoppingCart
     serializer_class = ShoppingCartSerializer
+    relation_name = 'shopping_cart'
+
+
+class BulkSubscribeView(BulkPostDeleteMixin, SubscribeView):
+    """Подписка на авторов и отписка от них списком."""
+
+
+class BulkFavoriteView(BulkPostDeleteMixin, FavoriteView):
+    """Добавление/удаление рецептов из избранного списком."""
+
+
+class BulkShoppingCartView(BulkPostDeleteMixin, ShoppingCartView):
+    """Добавление/удаление рецептов из списка покупок списком."""
@@ -34,6 +34,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,7 +72,8 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
     }
 }
 
@@ -111,12 +113,29 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+# В кэше хранятся представления и версии каждого рецепта и автора,
+# связи пользователей и токены: 300 записей LocMemCache по умолчанию
+# не хватает, и вытесненные версии сбрасывают кэш представлений.
+# Memcached не принимает MAX_ENTRIES, его объем задается флагом -m.
+if CACHES['default']['BACKEND'].endswith('.LocMemCache'):
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 100000)),
+    }
+
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.AllowAny",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'],
@@ -138,3 +157,42 @@ DJOSER = {
 USER_EMAIL_MAX_LENGTH = 254
 NAME_MAX_LENGTH = 150
 RECIPE_MAX_LENGTH = 200
+
+RECIPE_THUMBNAIL_SIZE = (480, 480)
+RECIPE_IMAGE_QUALITY = 80
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+
+REFERENCE_DATA_CACHE_TIMEOUT = 24 * 60 * 60
+REFERENCE_DATA_MAX_AGE = 60
+RELATIONS_CACHE_TIMEOUT = 60 * 60
+# 0 отключает кэш представлений рецептов.
+RECIPE_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+METRICS_MAX_SERIES = 500
+
+SHOPPING_LIST_PDF_WORKERS = int(os.getenv('SHOPPING_LIST_PDF_WORKERS', 1))
+SHOPPING_LIST_PDF_CACHE_TIMEOUT = 24 * 60 * 60
+SHOPPING_LIST_PDF_PENDING_TIMEOUT = 60
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+BULK_MAX_IDS = 100
+
+# Сериализация рецептов в list/retrieve из строк .values()
+# вместо RecipeSerializer.
+FAST_RECIPE_SERIALIZER = os.getenv(
+    'FAST_RECIPE_SERIALIZER', ''
+).lower() in ('1', 'true', 'yes')
+
+# Кэш токенов: общий кэш (не используется с LocMemCache) и память
+# процесса. Кэш в памяти процесса работает и без общего кэша, но другие
+# процессы принимают отозванный токен еще до TOKEN_LOCAL_CACHE_TIMEOUT
+# секунд; по умолчанию он отключен.
+TOKEN_CACHE_TIMEOUT = 5 * 60
+TOKEN_LOCAL_CACHE_TIMEOUT = int(os.getenv('TOKEN_LOCAL_CACHE_TIMEOUT', 0))
+TOKEN_CACHE_MAX_SIZE = 10000
+
+# Асинхронные представления для чтения; включать при запуске под ASGI.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', '').lower() in ('1', 'true', 'yes')
@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from .models import (Favorite, Ingredient, Recipe, RecipesIngredient,
-                     RecipesTag, ShoppingCart, Tag)
+                     RecipesTag, ShoppingCart, ShoppingCartIngredient, Tag)
 
 
 class TagsInLine(admin.TabularInline):
@@ -22,10 +22,28 @@ class RecipeAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
     inlines = (IngredientsInLine, TagsInLine)
 
+    @staticmethod
+    def get_amounts(recipe):
+        return dict(RecipesIngredient.objects.filter(
+            recipe=recipe
+        ).values_list('ingredient_id', 'amount'))
+
+    def save_related(self, request, form, formsets, change):
+        """Переносит изменения ингредиентов из формы в списки покупок
+        пользователей, у которых рецепт в корзине.
+        """
+        recipe = form.instance
+        old_amounts = self.get_amounts(recipe) if change else {}
+        super().save_related(request, form, formsets, change)
+        recipe.refresh_tags_mask()
+        if change:
+            ShoppingCartIngredient.objects.change_recipe(
+                recipe, old_amounts, self.get_amounts(recipe)
+            )
+
+    @admin.display(description='В избранном', ordering='favorites_count')
     def favorites(self, obj):
-        if Favorite.objects.filter(recipe=obj).exists():
-            return Favorite.objects.filter(recipe=obj).count()
-        return 0
+        return obj.favorites_count
 
 
 @admin.register(Ingredient)
@@ -37,7 +55,7 @@ class IngredientAdmin(admin.ModelAdmin):
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'color', 'slug')
+    list_display = ('id', 'name', 'color', 'slug', 'bit')
     search_fields = ('name', 'slug')
     empty_value_display = '-пусто-'
 
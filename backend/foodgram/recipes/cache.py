@@ -0,0 +1,83 @@
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import F
+
+from .models import CacheVersion
+
+VERSION_KEY = 'recipes:version:{}'
+# Версии отдельных рецептов и авторов для кэша представлений рецептов.
+RECIPE_VERSION = 'recipe:{}'
+AUTHOR_VERSION = 'author:{}'
+
+
+def is_shared_cache():
+    """Общий ли кэш Django для всех процессов. Изменения в кэше памяти
+    одного процесса (LocMemCache) не видны другим, например gunicorn
+    не узнает о версии, увеличенной командой manage.py.
+    """
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def get_version(name):
+    """Возвращает текущую версию набора данных."""
+    if not is_shared_cache():
+        return get_versions([name])[name]
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        return cache.get(key)
+    return version
+
+
+def bump_version(name):
+    """Увеличивает версию набора данных после его изменения."""
+    if not is_shared_cache():
+        CacheVersion.objects.bulk_create(
+            [CacheVersion(name=name)], ignore_conflicts=True
+        )
+        CacheVersion.objects.filter(name=name).update(
+            version=F('version') + 1
+        )
+        return get_versions([name])[name]
+    key = VERSION_KEY.format(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+        return cache.get(key)
+
+
+def get_versions(names):
+    """Текущие версии нескольких наборов данных одним запросом к кэшу
+    или, если кэш у процесса свой, к базе данных.
+    """
+    if not is_shared_cache():
+        versions = dict(CacheVersion.objects.filter(
+            name__in=names
+        ).values_list('name', 'version'))
+        return {name: versions.get(name, 0) for name in names}
+    keys = {name: VERSION_KEY.format(name) for name in names}
+    versions = cache.get_many(keys.values())
+    missing = [key for key in keys.values() if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, time.time_ns(), timeout=None)
+        versions.update(cache.get_many(missing))
+    return {name: versions.get(key) for name, key in keys.items()}
+
+
+def bump_versions_on_commit(names):
+    """Увеличивает версии после фиксации транзакции, чтобы кэш
+    не заполнился данными, которые еще не видны другим запросам.
+    """
+    names = list(names)
+
+    def bump():
+        for name in names:
+            bump_version(name)
+    transaction.on_commit(bump)
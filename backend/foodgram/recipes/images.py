@@ -0,0 +1,88 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image
+
+from .cache import RECIPE_VERSION, bump_versions_on_commit
+from .models import ImageBlob, Recipe
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    return ThreadPoolExecutor(
+        max_workers=settings.RECIPE_IMAGE_WORKERS,
+        thread_name_prefix='recipe-images'
+    )
+
+
+def encode_webp(image, size=None):
+    image = image.convert(
+        'RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB'
+    )
+    if size:
+        image.thumbnail(size)
+    buffer = BytesIO()
+    image.save(buffer, 'WEBP', quality=settings.RECIPE_IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def build_derivatives(recipe_id):
+    """Создает миниатюру и WebP-версию изображения рецепта."""
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+    with recipe.image.open('rb') as file:
+        image = Image.open(file)
+        image.load()
+    stem = Path(recipe.image.name).stem
+    recipe.thumbnail.save(
+        f'{stem}_thumb.webp',
+        ContentFile(encode_webp(image, settings.RECIPE_THUMBNAIL_SIZE)),
+        save=False
+    )
+    recipe.image_webp.save(
+        f'{stem}.webp', ContentFile(encode_webp(image)), save=False
+    )
+    names = recipe.image_names()
+    with transaction.atomic():
+        if Recipe.objects.filter(
+            pk=recipe_id, image=recipe.image.name
+        ).update(
+            thumbnail=recipe.thumbnail.name,
+            image_webp=recipe.image_webp.name
+        ):
+            ImageBlob.objects.acquire(
+                (names['thumbnail'], names['image_webp'])
+            )
+            ImageBlob.objects.release((
+                recipe.loaded_images['thumbnail'],
+                recipe.loaded_images['image_webp']
+            ))
+            bump_versions_on_commit([RECIPE_VERSION.format(recipe_id)])
+
+
+def _run(recipe_id):
+    try:
+        build_derivatives(recipe_id)
+    except Exception:
+        logger.exception('Failed to build images for recipe %s', recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_derivatives(recipe):
+    """Ставит обработку изображения в очередь после фиксации транзакции.
+    Пока обработка не завершена, отдается исходное изображение.
+    """
+    if not settings.RECIPE_IMAGE_WORKERS:
+        transaction.on_commit(lambda: build_derivatives(recipe.id))
+        return
+    transaction.on_commit(lambda: get_executor().submit(_run, recipe.id))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from recipes.images import build_derivatives
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Build thumbnails and WebP images for recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Rebuild images for recipes that already have them'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(thumbnail='') | recipes.filter(
+                image_webp=''
+            )
+        recipe_ids = list(recipes.values_list('id', flat=True))
+        for recipe_id in recipe_ids:
+            build_derivatives(recipe_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'Built images for {len(recipe_ids)} recipes'
+        ))
@@ -0,0 +1,78 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from recipes.models import ImageBlob, Recipe
+
+
+class Command(BaseCommand):
+    help = 'Delete recipe image files that no recipe references'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report files that would be deleted'
+        )
+        parser.add_argument(
+            '--grace-period',
+            type=int,
+            default=3600,
+            help='Keep unreferenced files younger than this many seconds'
+        )
+        parser.add_argument(
+            '--path',
+            default='recipes_images',
+            help='Storage directory to scan'
+        )
+
+    def handle(self, *args, **options):
+        references = Counter()
+        for names in Recipe.objects.values_list(
+            *Recipe.IMAGE_FIELDS
+        ).iterator():
+            references.update(name for name in names if name)
+        if not options['dry_run']:
+            self.recount(references)
+
+        storage = Recipe._meta.get_field('image').storage
+        threshold = timezone.now() - timedelta(
+            seconds=options['grace_period']
+        )
+        deleted = freed = 0
+        for name in storage.walk(options['path']):
+            if name in references:
+                continue
+            if storage.get_modified_time(name) > threshold:
+                continue
+            deleted += 1
+            freed += storage.size(name)
+            self.stdout.write(f'Unreferenced: {name}')
+            if not options['dry_run']:
+                storage.delete(name)
+                ImageBlob.objects.filter(name=name).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'{deleted} files, {freed} bytes '
+            f'{"can be" if options["dry_run"] else "were"} freed'
+        ))
+
+    def recount(self, references):
+        """Исправляет счетчики ссылок, разошедшиеся с рецептами."""
+        blobs = dict(ImageBlob.objects.values_list('name', 'ref_count'))
+        ImageBlob.objects.bulk_create(
+            [
+                ImageBlob(name=name, ref_count=count)
+                for name, count in references.items() if name not in blobs
+            ],
+            ignore_conflicts=True
+        )
+        changed = {
+            name: references.get(name, 0)
+            for name, count in blobs.items()
+            if references.get(name, 0) != count
+        }
+        for name, count in changed.items():
+            ImageBlob.objects.filter(name=name).update(ref_count=count)
+        if changed:
+            self.stdout.write(f'Fixed {len(changed)} reference counts')
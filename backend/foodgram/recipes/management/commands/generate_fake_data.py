@@ -0,0 +1,184 @@
+import io
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+from recipes.models import (Favorite, ImageBlob, Ingredient, Recipe,
+                            RecipesIngredient, RecipesTag, ShoppingCart, Tag)
+from users.models import CustomUser, Subscription
+
+WORDS = (
+    'суп', 'салат', 'пирог', 'каша', 'омлет', 'рагу', 'паста', 'запеканка',
+    'томатный', 'грибной', 'куриный', 'овощной', 'сырный', 'домашний',
+    'быстрый', 'летний', 'острый', 'сладкий', 'с', 'и', 'по-деревенски',
+)
+
+
+def insert(model, objs, batch_size):
+    """bulk_create, после которого у объектов заполнены id.
+
+    Django 3.2 не возвращает id из bulk_create в SQLite,
+    поэтому они читаются из базы по порядку вставки.
+    """
+    last_id = model.objects.order_by('-id').values_list(
+        'id', flat=True
+    ).first() or 0
+    model.objects.bulk_create(objs, batch_size=batch_size)
+    if objs and objs[0].pk is None:
+        ids = model.objects.filter(id__gt=last_id).order_by(
+            'id'
+        ).values_list('id', flat=True)
+        for obj, pk in zip(objs, ids):
+            obj.pk = pk
+    return objs
+
+
+class Command(BaseCommand):
+    help = 'Seed the database with reproducible synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument(
+            '--recipes', type=int, default=1000,
+            help='Total number of recipes, spread over the new users'
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Favorite recipes per user'
+        )
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Recipes in the shopping cart per user'
+        )
+        parser.add_argument(
+            '--subscriptions', type=int, default=10,
+            help='Followed authors per user'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        tags = list(Tag.objects.all())
+        if not ingredients or not tags:
+            raise CommandError(
+                'Load ingredients and tags first: manage.py load_data'
+            )
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+        with transaction.atomic():
+            users = self.create_users(options['users'], batch_size)
+            recipes = self.create_recipes(
+                rng, users, tags, ingredients, options
+            )
+            self.create_relations(rng, users, recipes, options)
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('rebuild_shopping_cart', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(users)} users, {len(recipes)} recipes created '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
+
+    @staticmethod
+    def create_users(count, batch_size):
+        offset = CustomUser.objects.count()
+        password = make_password('fake-password')
+        return insert(CustomUser, [
+            CustomUser(
+                email=f'fake{number}@example.com',
+                username=f'fake{number}',
+                first_name='Имя',
+                last_name=f'Фамилия {number}',
+                password=password
+            )
+            for number in range(offset, offset + count)
+        ], batch_size)
+
+    @staticmethod
+    def create_image():
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64), (230, 120, 40)).save(buffer, 'PNG')
+        storage = Recipe._meta.get_field('image').storage
+        return storage.save(
+            'recipes_images/fake.png', ContentFile(buffer.getvalue())
+        )
+
+    def create_recipes(self, rng, users, tags, ingredients, options):
+        if not users or not options['recipes']:
+            return []
+        image = self.create_image()
+        recipes, recipe_tags = [], []
+        for number in range(options['recipes']):
+            recipe_tags.append(rng.sample(tags, rng.randint(1, len(tags))))
+            recipes.append(Recipe(
+                author=rng.choice(users),
+                name=' '.join(rng.choices(WORDS, k=3)).capitalize(),
+                text=' '.join(rng.choices(WORDS, k=40)),
+                cooking_time=rng.randint(1, 180),
+                image=image,
+                tags_mask=Tag.mask_of(recipe_tags[-1])
+            ))
+        insert(Recipe, recipes, options['batch_size'])
+        ImageBlob.objects.acquire([image] * len(recipes))
+        RecipesTag.objects.bulk_create(
+            [
+                RecipesTag(recipe=recipe, tag=tag)
+                for recipe, tags in zip(recipes, recipe_tags)
+                for tag in tags
+            ],
+            batch_size=options['batch_size']
+        )
+        per_recipe = min(options['ingredients_per_recipe'], len(ingredients))
+        RecipesIngredient.objects.bulk_create(
+            [
+                RecipesIngredient(
+                    recipe=recipe,
+                    ingredient_id=ingredient,
+                    amount=rng.randint(1, 500)
+                )
+                for recipe in recipes
+                for ingredient in rng.sample(ingredients, per_recipe)
+            ],
+            batch_size=options['batch_size']
+        )
+        return recipes
+
+    @staticmethod
+    def create_relations(rng, users, recipes, options):
+        batch_size = options['batch_size']
+        for model, count in (
+            (Favorite, options['favorites']),
+            (ShoppingCart, options['carts']),
+        ):
+            count = min(count, len(recipes))
+            model.objects.bulk_create(
+                [
+                    model(user=user, recipe=recipe)
+                    for user in users
+                    for recipe in rng.sample(recipes, count)
+                ],
+                batch_size=batch_size
+            )
+        count = min(options['subscriptions'], len(users) - 1)
+        subscriptions = []
+        for user in users:
+            authors = [
+                author for author in rng.sample(users, count + 1)
+                if author != user
+            ]
+            subscriptions.extend(
+                Subscription(user=user, following=author)
+                for author in authors[:count]
+            )
+        Subscription.objects.bulk_create(
+            subscriptions, batch_size=batch_size
+        )
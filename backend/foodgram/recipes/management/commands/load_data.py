@@ -1,19 +1,145 @@
+import csv
 import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.cache import bump_version
 from recipes.models import Ingredient, Tag
 
+DATASETS = (
+    # (имя файла, модель, уникальное поле, обновляемые поля)
+    ('ingredients', Ingredient, None, ()),
+    ('tags', Tag, 'slug', ('name', 'color')),
+)
+
+
+def read_csv(file):
+    yield from csv.DictReader(file)
+
+
+def read_json(file, chunk_size=64 * 1024):
+    """Читает JSON-массив объектов по одному элементу,
+    не загружая весь файл в память.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError(f'{file.name}: expected a JSON array')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise CommandError(f'{file.name}: unexpected end of file')
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+READERS = {'csv': read_csv, 'json': read_json}
+
 
 class Command(BaseCommand):
-    help = 'Load JSON ingredients and tags data'
+    help = 'Load ingredients and tags from CSV or JSON files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=Path(settings.BASE_DIR) / 'data',
+            type=Path,
+            help='Directory with ingredients and tags files'
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            default='csv',
+            help='Format of the data files'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows written per query'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Load the data and roll the transaction back'
+        )
 
     def handle(self, *args, **options):
-        with open('data/ingredients.json') as ingredients_data:
-            ingredients = json.load(ingredients_data)
-        for ingredient in ingredients:
-            Ingredient.objects.get_or_create(**ingredient)
-
-        with open('data/tags.json') as tags_data:
-            tags = json.load(tags_data)
-        for tag in tags:
-            Tag.objects.get_or_create(**tag)
+        with transaction.atomic():
+            for name, model, key, update_fields in DATASETS:
+                path = Path(options['path']) / f'{name}.{options["format"]}'
+                if not path.exists():
+                    raise CommandError(f'File {path} not found')
+                with open(path, encoding='utf-8') as file:
+                    self.load(
+                        name, model, key, update_fields,
+                        READERS[options['format']](file),
+                        options['batch_size']
+                    )
+            if options['dry_run']:
+                transaction.set_rollback(True)
+                self.stdout.write('Dry run: changes rolled back')
+                return
+        for name, *_ in DATASETS:
+            bump_version(name)
+
+    def load(self, name, model, key, update_fields, rows, batch_size):
+        started = time.perf_counter()
+        count_before = model.objects.count()
+        total = updated = 0
+        while True:
+            batch = [model(**row) for row in islice(rows, batch_size)]
+            if not batch:
+                break
+            if update_fields:
+                updated += self.update_existing(
+                    model, key, update_fields, batch, batch_size
+                )
+            model.objects.bulk_create(
+                batch, batch_size=batch_size, ignore_conflicts=True
+            )
+            total += len(batch)
+            self.stdout.write(f'{name}: {total} rows processed')
+        elapsed = time.perf_counter() - started
+        created = model.objects.count() - count_before
+        self.stdout.write(self.style.SUCCESS(
+            f'{name}: {total} rows, {created} created, {updated} updated '
+            f'in {elapsed:.3f}s ({total / max(elapsed, 1e-9):.0f} rows/s)'
+        ))
+
+    @staticmethod
+    def update_existing(model, key, update_fields, batch, batch_size):
+        """Обновляет уже существующие строки пакета по уникальному полю."""
+        existing = model.objects.in_bulk(
+            [getattr(obj, key) for obj in batch], field_name=key
+        )
+        changed = []
+        for obj in batch:
+            current = existing.get(getattr(obj, key))
+            if current is None:
+                continue
+            if any(
+                getattr(current, field) != getattr(obj, field)
+                for field in update_fields
+            ):
+                for field in update_fields:
+                    setattr(current, field, getattr(obj, field))
+                changed.append(current)
+        if changed:
+            model.objects.bulk_update(
+                changed, update_fields, batch_size=batch_size
+            )
+        return len(changed)
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.models import ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = 'Rebuild shopping cart ingredient totals or check them for drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report rows that differ from the carts contents'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows inserted per query'
+        )
+
+    def handle(self, *args, **options):
+        expected = {
+            (row['user_id'], row['ingredient_id']): (
+                row['total_amount'], row['recipe_count']
+            )
+            for row in ShoppingCartIngredient.objects.calculate()
+        }
+        if options['check']:
+            self.check_drift(expected)
+            return
+        with transaction.atomic():
+            ShoppingCartIngredient.objects.all().delete()
+            ShoppingCartIngredient.objects.bulk_create(
+                [
+                    ShoppingCartIngredient(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total_amount=total_amount,
+                        recipe_count=recipe_count
+                    )
+                    for (user_id, ingredient_id), (
+                        total_amount, recipe_count
+                    ) in expected.items()
+                ],
+                batch_size=options['batch_size']
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(expected)} shopping cart rows'
+        ))
+
+    def check_drift(self, expected):
+        actual = {
+            (user_id, ingredient_id): (total_amount, recipe_count)
+            for user_id, ingredient_id, total_amount, recipe_count
+            in ShoppingCartIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount', 'recipe_count'
+            ).iterator()
+        }
+        drift = [
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        ]
+        for user_id, ingredient_id in sorted(drift):
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'expected {expected.get((user_id, ingredient_id))}, '
+                f'found {actual.get((user_id, ingredient_id))}'
+            )
+        if drift:
+            raise CommandError(f'{len(drift)} shopping cart rows drifted')
+        self.stdout.write(self.style.SUCCESS('No drift found'))
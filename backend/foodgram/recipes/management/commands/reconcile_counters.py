@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from recipes.signals import COUNTERS
+
+
+class Command(BaseCommand):
+    help = 'Recalculate denormalized counters or check them for drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report counters that differ from the actual rows'
+        )
+
+    def handle(self, *args, **options):
+        drifted = 0
+        for sender, model, key, field in COUNTERS:
+            lookup = key[:-len('_id')]
+            actual = Coalesce(
+                Subquery(
+                    sender.objects.filter(**{lookup: OuterRef('pk')})
+                    .order_by().values(lookup).annotate(count=Count('pk'))
+                    .values('count'),
+                    output_field=IntegerField()
+                ),
+                0
+            )
+            if options['check']:
+                count = model.objects.annotate(actual=actual).filter(
+                    ~Q(**{field: F('actual')})
+                ).count()
+            else:
+                count = model.objects.update(**{field: actual})
+            drifted += count
+            self.stdout.write(
+                f'{model._meta.model_name}.{field}: '
+                f'{count} {"drifted" if options["check"] else "updated"}'
+            )
+        if options['check'] and drifted:
+            raise CommandError(f'{drifted} counters drifted')
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,59 @@
+# Generated by Django 3.2 on 2026-10-18 09:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+
+def fill_shopping_cart_ingredients(apps, schema_editor):
+    """Заполняет списки покупок по уже существующим корзинам,
+    как ShoppingCartIngredientManager.calculate().
+    """
+    RecipesIngredient = apps.get_model('recipes', 'RecipesIngredient')
+    ShoppingCartIngredient = apps.get_model(
+        'recipes', 'ShoppingCartIngredient'
+    )
+    rows = RecipesIngredient.objects.filter(
+        recipe__shoppingcart__isnull=False
+    ).values(
+        'ingredient_id', user_id=F('recipe__shoppingcart__user')
+    ).annotate(
+        total_amount=Sum('amount'), recipe_count=Count('recipe')
+    ).order_by()
+    ShoppingCartIngredient.objects.bulk_create(
+        (ShoppingCartIngredient(**row) for row in rows.iterator()),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.IntegerField(default=0, verbose_name='Количество')),
+                ('recipe_count', models.IntegerField(default=0, verbose_name='Число рецептов')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_ingredients', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент списка покупок',
+                'verbose_name_plural': 'Ингредиенты списка покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_user_ingredient_in_cart'),
+        ),
+        migrations.RunPython(
+            fill_shopping_cart_ingredients, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 3.2 on 2026-10-18 09:30
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Sum
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Оставляет по одному ингредиенту на пару (название, единица
+    измерения) и переносит на него ингредиенты рецептов. Повторы
+    ингредиентов в рецепте удаляет миграция 0010.
+    """
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipesIngredient = apps.get_model('recipes', 'RecipesIngredient')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep=Min('id'), count=Count('id')).filter(count__gt=1)
+    deleted = 0
+    for duplicate in duplicates:
+        ingredients = Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(id=duplicate['keep'])
+        RecipesIngredient.objects.filter(
+            ingredient__in=ingredients
+        ).update(ingredient=duplicate['keep'])
+        deleted += ingredients.delete()[0]
+    if deleted:
+        rebuild_shopping_cart_ingredients(apps)
+
+
+def rebuild_shopping_cart_ingredients(apps):
+    """Пересчитывает списки покупок после объединения ингредиентов."""
+    RecipesIngredient = apps.get_model('recipes', 'RecipesIngredient')
+    ShoppingCartIngredient = apps.get_model(
+        'recipes', 'ShoppingCartIngredient'
+    )
+    ShoppingCartIngredient.objects.all().delete()
+    rows = RecipesIngredient.objects.filter(
+        recipe__shoppingcart__isnull=False
+    ).values(
+        'ingredient_id', user_id=F('recipe__shoppingcart__user')
+    ).annotate(
+        total_amount=Sum('amount'), recipe_count=Count('recipe')
+    ).order_by()
+    ShoppingCartIngredient.objects.bulk_create(
+        (ShoppingCartIngredient(**row) for row in rows.iterator()),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_shoppingcartingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AlterField(
+            model_name='ingredient',
+            name='name',
+            field=models.CharField(max_length=150, verbose_name='Название ингредиента'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_measurement_unit'),
+        ),
+    ]
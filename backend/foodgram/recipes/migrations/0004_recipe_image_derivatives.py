@@ -0,0 +1,23 @@
+# Generated by Django 3.2 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_ingredient_unique_measurement_unit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_webp',
+            field=models.ImageField(blank=True, upload_to='recipes_images/derivatives/', verbose_name='Изображение рецепта в формате WebP'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='thumbnail',
+            field=models.ImageField(blank=True, upload_to='recipes_images/derivatives/', verbose_name='Миниатюра рецепта'),
+        ),
+    ]
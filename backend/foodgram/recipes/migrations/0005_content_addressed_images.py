@@ -0,0 +1,41 @@
+# Generated by Django 3.2 on 2026-10-18 10:30
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Имя файла')),
+                ('ref_count', models.IntegerField(default=0, verbose_name='Число ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл изображения',
+                'verbose_name_plural': 'Файлы изображений',
+            },
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.storage.ContentAddressedStorage(), upload_to='recipes_images/', verbose_name='Изображение рецепта'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image_webp',
+            field=models.ImageField(blank=True, storage=recipes.storage.ContentAddressedStorage(), upload_to='recipes_images/derivatives/', verbose_name='Изображение рецепта в формате WebP'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='thumbnail',
+            field=models.ImageField(blank=True, storage=recipes.storage.ContentAddressedStorage(), upload_to='recipes_images/derivatives/', verbose_name='Миниатюра рецепта'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 3.2 on 2026-10-18 13:00
+
+from django.db import migrations
+
+POSTGRESQL_FORWARD = (
+    "ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(text, '')), 'B')"
+    ") STORED",
+    'CREATE INDEX recipe_search_vector_idx ON recipes_recipe '
+    'USING GIN (search_vector)',
+)
+POSTGRESQL_BACKWARD = (
+    'DROP INDEX IF EXISTS recipe_search_vector_idx',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+)
+# Буква «ё» заменяется на «е» при индексации, как и в запросах.
+SQLITE_VALUES = (
+    "replace(replace({0}.name, 'ё', 'е'), 'Ё', 'Е'), "
+    "replace(replace({0}.text, 'ё', 'е'), 'Ё', 'Е')"
+)
+SQLITE_INSERT = (
+    'INSERT INTO recipes_recipe_fts(rowid, name, text) '
+    'VALUES (new.id, ' + SQLITE_VALUES.format('new') + ');'
+)
+SQLITE_DELETE = (
+    'INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text) '
+    "VALUES ('delete', old.id, " + SQLITE_VALUES.format('old') + ');'
+)
+SQLITE_FORWARD = (
+    'CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5('
+    "name, text, content='', tokenize='unicode61 remove_diacritics 2')",
+    'CREATE TRIGGER recipes_recipe_fts_insert AFTER INSERT ON recipes_recipe '
+    f'BEGIN {SQLITE_INSERT} END',
+    'CREATE TRIGGER recipes_recipe_fts_delete AFTER DELETE ON recipes_recipe '
+    f'BEGIN {SQLITE_DELETE} END',
+    'CREATE TRIGGER recipes_recipe_fts_update AFTER UPDATE OF name, text '
+    f'ON recipes_recipe BEGIN {SQLITE_DELETE} {SQLITE_INSERT} END',
+    'INSERT INTO recipes_recipe_fts(rowid, name, text) '
+    'SELECT id, ' + SQLITE_VALUES.format('recipes_recipe')
+    + ' FROM recipes_recipe',
+)
+SQLITE_BACKWARD = (
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_insert',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_update',
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+)
+
+
+def run(statements):
+    def execute(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return execute
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_popularity_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({
+                'postgresql': POSTGRESQL_FORWARD,
+                'sqlite': SQLITE_FORWARD,
+            }),
+            run({
+                'postgresql': POSTGRESQL_BACKWARD,
+                'sqlite': SQLITE_BACKWARD,
+            }),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.2 on 2026-10-18 14:00
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+TAG_BITS = 63
+
+
+def assign_bits(apps, schema_editor):
+    Tag = apps.get_model('recipes', 'Tag')
+    tags = list(Tag.objects.order_by('id'))
+    if len(tags) > TAG_BITS:
+        raise RuntimeError(f'Tag bitmask supports at most {TAG_BITS} tags')
+    for bit, tag in enumerate(tags):
+        tag.bit = bit
+    Tag.objects.bulk_update(tags, ['bit'])
+
+
+def fill_masks(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipesTag = apps.get_model('recipes', 'RecipesTag')
+    masks = defaultdict(int)
+    for recipe_id, bit in RecipesTag.objects.values_list(
+        'recipe_id', 'tag__bit'
+    ).iterator():
+        masks[recipe_id] |= 1 << bit
+    Recipe.objects.bulk_update(
+        [Recipe(id=recipe_id, tags_mask=mask)
+         for recipe_id, mask in masks.items()],
+        ['tags_mask'],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, verbose_name='Бит в маске тегов'),
+        ),
+        migrations.RunPython(assign_bits, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, unique=True, verbose_name='Бит в маске тегов'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.RunPython(fill_masks, migrations.RunPython.noop),
+    ]
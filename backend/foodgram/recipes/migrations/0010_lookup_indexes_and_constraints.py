@@ -0,0 +1,76 @@
+# Generated by Django 3.2 on 2026-10-18 15:00
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Sum
+
+UNIQUE_PAIRS = (
+    ('Favorite', ('user', 'recipe')),
+    ('ShoppingCart', ('user', 'recipe')),
+    ('RecipesIngredient', ('recipe', 'ingredient')),
+    ('RecipesTag', ('recipe', 'tag')),
+)
+
+
+def delete_duplicates(apps, schema_editor):
+    deleted = 0
+    for model_name, fields in UNIQUE_PAIRS:
+        model = apps.get_model('recipes', model_name)
+        keep = model.objects.values(*fields).annotate(
+            keep=Min('id')
+        ).values_list('keep', flat=True)
+        deleted += model.objects.exclude(id__in=list(keep)).delete()[0]
+    if deleted:
+        rebuild_shopping_cart_ingredients(apps)
+
+
+def rebuild_shopping_cart_ingredients(apps):
+    """Пересчитывает списки покупок после удаления повторов
+    в корзинах и ингредиентах рецептов.
+    """
+    RecipesIngredient = apps.get_model('recipes', 'RecipesIngredient')
+    ShoppingCartIngredient = apps.get_model(
+        'recipes', 'ShoppingCartIngredient'
+    )
+    ShoppingCartIngredient.objects.all().delete()
+    rows = RecipesIngredient.objects.filter(
+        recipe__shoppingcart__isnull=False
+    ).values(
+        'ingredient_id', user_id=F('recipe__shoppingcart__user')
+    ).annotate(
+        total_amount=Sum('amount'), recipe_count=Count('recipe')
+    ).order_by()
+    ShoppingCartIngredient.objects.bulk_create(
+        (ShoppingCartIngredient(**row) for row in rows.iterator()),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_tag_bitmask'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_user_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipesingredient',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipestag',
+            constraint=models.UniqueConstraint(fields=('recipe', 'tag'), name='unique_recipe_tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_user_shopping_cart'),
+        ),
+    ]
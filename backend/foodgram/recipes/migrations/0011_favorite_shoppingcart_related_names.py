@@ -0,0 +1,24 @@
+# Generated by Django 3.2 on 2026-10-18 06:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_lookup_indexes_and_constraints'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='favorite',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to='recipes.recipe', verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart', to='recipes.recipe', verbose_name='Пользователь'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_favorite_shoppingcart_related_names'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число добавлений в избранное'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число добавлений в список покупок'),
+        ),
+    ]
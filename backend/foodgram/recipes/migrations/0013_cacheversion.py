@@ -0,0 +1,24 @@
+# Generated by Django 3.2 on 2026-10-18 06:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_counters_not_editable'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Набор данных')),
+                ('version', models.BigIntegerField(default=0, verbose_name='Версия')),
+            ],
+            options={
+                'verbose_name': 'Версия кэша',
+                'verbose_name_plural': 'Версии кэша',
+            },
+        ),
+    ]
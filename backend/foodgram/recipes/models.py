@@ -1,8 +1,40 @@
+from collections import Counter
+
 from colorfield.fields import ColorField
+from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import Case, Count, F, Prefetch, Sum, When, Window
+from django.db.models.functions import RowNumber
 from foodgram.settings import NAME_MAX_LENGTH, RECIPE_MAX_LENGTH
-from users.models import CustomUser
+from users.models import CounterFieldsMixin, CustomUser
+
+from .storage import ContentAddressedStorage
+from .units import canonical_unit, unit_factor
+
+
+# Маска тегов рецепта хранится в BigIntegerField со знаком.
+TAG_BITS = 63
+
+
+class TagManager(models.Manager):
+    """Назначает тегам свободные биты маски при создании."""
+
+    def free_bits(self, count):
+        used = set(self.values_list('bit', flat=True))
+        bits = [bit for bit in range(TAG_BITS) if bit not in used][:count]
+        if len(bits) < count:
+            raise ValidationError(
+                f'Нельзя создать больше {TAG_BITS} тегов.'
+            )
+        return bits
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        new = [tag for tag in objs if tag.bit is None]
+        for tag, bit in zip(new, self.free_bits(len(new))):
+            tag.bit = bit
+        return super().bulk_create(objs, *args, **kwargs)
 
 
 class Tag(models.Model):
@@ -22,10 +54,34 @@ class Tag(models.Model):
         max_length=NAME_MAX_LENGTH,
         unique=True
     )
+    bit = models.PositiveSmallIntegerField(
+        unique=True,
+        editable=False,
+        verbose_name='Бит в маске тегов'
+    )
+
+    objects = TagManager()
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            self.bit = Tag.objects.free_bits(1)[0]
+        super().save(*args, **kwargs)
+
+    @property
+    def mask(self):
+        return 1 << self.bit
+
+    @staticmethod
+    def mask_of(tags):
+        """Маска, в которой установлены биты всех тегов."""
+        mask = 0
+        for tag in tags:
+            mask |= tag.mask
+        return mask
+
     class Meta:
         ordering = ('name',)
         verbose_name = 'Тег'
@@ -49,9 +105,59 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_measurement_unit'
+            )
+        ]
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов для вывода рецептов
+    с фиксированным числом обращений к базе данных.
+    """
 
+    def with_related(self):
+        """Подгружает автора, теги и ингредиенты рецептов."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredientsinrecipe',
+                queryset=RecipesIngredient.objects.select_related(
+                    'ingredient'
+                ).order_by('id')
+            )
+        )
 
-class Recipe(models.Model):
+    def with_any_tag(self, tags):
+        """Рецепты хотя бы с одним из тегов: одно условие на маску,
+        без соединений с таблицами тегов и без дубликатов.
+        """
+        return self.alias(
+            matched_tags=F('tags_mask').bitand(Tag.mask_of(tags))
+        ).filter(matched_tags__gt=0)
+
+    def latest_by_author(self, author_ids, limit=None):
+        """Последние рецепты каждого из авторов одним запросом.
+        Ограничение limit применяется через ROW_NUMBER() OVER (PARTITION BY).
+        """
+        recipes = self.filter(author__in=author_ids)
+        if limit is None:
+            return recipes
+        sql, params = recipes.annotate(row_number=Window(
+            RowNumber(),
+            partition_by=F('author'),
+            order_by=(F('pub_date').desc(), F('id').desc())
+        )).order_by().query.sql_with_params()
+        return self.raw(
+            f'SELECT * FROM ({sql}) AS windowed '
+            'WHERE row_number <= %s ORDER BY author_id, row_number',
+            params + (limit,)
+        )
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     """Модель рецепта."""
     author = models.ForeignKey(
         CustomUser,
@@ -65,8 +171,21 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes_images/',
+        storage=ContentAddressedStorage(),
         verbose_name='Изображение рецепта'
     )
+    thumbnail = models.ImageField(
+        upload_to='recipes_images/derivatives/',
+        storage=ContentAddressedStorage(),
+        blank=True,
+        verbose_name='Миниатюра рецепта'
+    )
+    image_webp = models.ImageField(
+        upload_to='recipes_images/derivatives/',
+        storage=ContentAddressedStorage(),
+        blank=True,
+        verbose_name='Изображение рецепта в формате WebP'
+    )
     text = models.TextField(
         verbose_name='Описание рецепта'
     )
@@ -75,6 +194,11 @@ class Recipe(models.Model):
         through='RecipesTag',
         verbose_name='Теги'
     )
+    tags_mask = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Маска тегов'
+    )
     ingredients = models.ManyToManyField(
         Ingredient,
         through='RecipesIngredient',
@@ -91,14 +215,63 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число добавлений в избранное'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число добавлений в список покупок'
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    COUNTER_FIELDS = ('favorites_count', 'in_carts_count')
+    IMAGE_FIELDS = ('image', 'thumbnail', 'image_webp')
 
     def __str__(self):
         return f'{self.author} - {self.name}({self.tags})'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_images = instance.image_names()
+        return instance
+
+    def refresh_tags_mask(self):
+        """Пересчитывает маску тегов по связям RecipesTag."""
+        self.tags_mask = Tag.mask_of(self.tags.only('bit'))
+        Recipe.objects.filter(pk=self.pk).update(tags_mask=self.tags_mask)
+
+    def image_names(self):
+        """Имена файлов изображений, загруженных из базы данных."""
+        deferred = self.get_deferred_fields()
+        return {
+            field: getattr(self, field).name
+            for field in self.IMAGE_FIELDS
+            if field not in deferred
+        }
+
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date', '-id'],
+                name='recipe_favorites_count_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            )
+        ]
 
 
 class RecipesIngredient(models.Model):
@@ -124,6 +297,12 @@ class RecipesIngredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент рецепта'
         verbose_name_plural = 'Ингредиенты рецепта'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'ingredient'],
+                name='unique_recipe_ingredient'
+            )
+        ]
 
 
 class RecipesTag(models.Model):
@@ -143,6 +322,12 @@ class RecipesTag(models.Model):
     class Meta:
         verbose_name = 'Тег, к которому относится рецепт'
         verbose_name_plural = 'Теги, к которым относится рецепт'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'tag'],
+                name='unique_recipe_tag'
+            )
+        ]
 
 
 class Favorite(models.Model):
@@ -166,6 +351,12 @@ class Favorite(models.Model):
     class Meta:
         verbose_name = 'Избранные рецепты'
         verbose_name_plural = 'Избранные рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_user_favorite'
+            )
+        ]
 
 
 class ShoppingCart(models.Model):
@@ -189,3 +380,232 @@ class ShoppingCart(models.Model):
     class Meta:
         verbose_name = 'Корзина'
         verbose_name_plural = 'Корзина'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_user_shopping_cart'
+            )
+        ]
+
+
+class ShoppingCartIngredientManager(models.Manager):
+    """Инкрементальное обновление суммарного списка покупок."""
+
+    def apply(self, users, changes):
+        """Применяет изменения {ingredient_id: (amount, recipe_count)}
+        к спискам покупок указанных пользователей.
+        """
+        users = list(users)
+        if not users or not changes:
+            return
+        self.bulk_create(
+            [
+                self.model(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in users
+                for ingredient_id, (_, count) in changes.items()
+                if count > 0
+            ],
+            ignore_conflicts=True
+        )
+        rows = self.filter(user__in=users, ingredient__in=changes)
+        rows.update(
+            total_amount=F('total_amount') + Case(
+                *[
+                    When(ingredient_id=ingredient_id, then=amount)
+                    for ingredient_id, (amount, _) in changes.items()
+                ],
+                default=0,
+                output_field=models.IntegerField()
+            ),
+            recipe_count=F('recipe_count') + Case(
+                *[
+                    When(ingredient_id=ingredient_id, then=count)
+                    for ingredient_id, (_, count) in changes.items()
+                ],
+                default=0,
+                output_field=models.IntegerField()
+            )
+        )
+        if any(count < 0 for _, count in changes.values()):
+            rows.filter(recipe_count__lte=0).delete()
+
+    def add_recipe(self, users, recipe):
+        self.add_recipes(users, [recipe])
+
+    def remove_recipe(self, users, recipe):
+        self.remove_recipes(users, [recipe])
+
+    def add_recipes(self, users, recipes):
+        self.apply(users, self.recipes_changes(recipes, 1))
+
+    def remove_recipes(self, users, recipes):
+        self.apply(users, self.recipes_changes(recipes, -1))
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        """Переносит изменение ингредиентов рецепта в списки покупок
+        всех пользователей, добавивших рецепт в корзину.
+        """
+        changes = {}
+        for ingredient_id in old_amounts.keys() | new_amounts.keys():
+            old = old_amounts.get(ingredient_id)
+            new = new_amounts.get(ingredient_id)
+            if old == new:
+                continue
+            changes[ingredient_id] = (
+                (new or 0) - (old or 0),
+                (new is not None) - (old is not None)
+            )
+        if changes:
+            self.apply(
+                ShoppingCart.objects.filter(
+                    recipe=recipe
+                ).values_list('user_id', flat=True),
+                changes
+            )
+
+    @staticmethod
+    def recipes_changes(recipes, sign):
+        """Изменения списка покупок при добавлении (sign=1)
+        или удалении (sign=-1) рецептов, одним запросом.
+        """
+        return {
+            row['ingredient_id']: (sign * row['amount'], sign * row['count'])
+            for row in RecipesIngredient.objects.filter(
+                recipe__in=recipes
+            ).values('ingredient_id').annotate(
+                amount=Sum('amount'), count=Count('recipe')
+            ).order_by()
+        }
+
+    def shopping_list(self, user):
+        """Список покупок пользователя одним агрегирующим запросом:
+        количества в совместимых единицах переводятся в основную
+        единицу и складываются по названию продукта.
+        """
+        return self.filter(user=user).values(
+            name=F('ingredient__name'),
+            measurement_unit=canonical_unit('ingredient__measurement_unit')
+        ).annotate(
+            amount=Sum(
+                F('total_amount') * unit_factor('ingredient__measurement_unit')
+            )
+        ).order_by('name', 'measurement_unit')
+
+    @staticmethod
+    def calculate():
+        """Считает список покупок с нуля по содержимому корзин."""
+        return RecipesIngredient.objects.filter(
+            recipe__shopping_cart__isnull=False
+        ).values(
+            'ingredient_id', user_id=F('recipe__shopping_cart__user')
+        ).annotate(
+            total_amount=Sum('amount'), recipe_count=Count('recipe')
+        ).order_by()
+
+
+class ShoppingCartIngredient(models.Model):
+    """Модель суммарного количества ингредиента
+    в списке покупок пользователя.
+    """
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='shopping_cart_ingredients'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.IntegerField(
+        default=0,
+        verbose_name='Количество'
+    )
+    recipe_count = models.IntegerField(
+        default=0,
+        verbose_name='Число рецептов'
+    )
+
+    objects = ShoppingCartIngredientManager()
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} {self.total_amount}'
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списка покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user_ingredient_in_cart'
+            )
+        ]
+
+
+class ImageBlobManager(models.Manager):
+    """Учет ссылок рецептов на файлы изображений."""
+
+    def acquire(self, names):
+        counts = Counter(name for name in names if name)
+        self.bulk_create(
+            [self.model(name=name) for name in counts],
+            ignore_conflicts=True
+        )
+        self.add_references(counts)
+
+    def release(self, names):
+        self.add_references({
+            name: -count
+            for name, count in Counter(
+                name for name in names if name
+            ).items()
+        })
+
+    def add_references(self, counts):
+        for name, count in counts.items():
+            self.filter(name=name).update(ref_count=F('ref_count') + count)
+
+
+class ImageBlob(models.Model):
+    """Файл изображения и число ссылающихся на него полей рецептов."""
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Имя файла'
+    )
+    ref_count = models.IntegerField(
+        default=0,
+        verbose_name='Число ссылок'
+    )
+
+    objects = ImageBlobManager()
+
+    def __str__(self):
+        return f'{self.name} ({self.ref_count})'
+
+    class Meta:
+        verbose_name = 'Файл изображения'
+        verbose_name_plural = 'Файлы изображений'
+
+
+class CacheVersion(models.Model):
+    """Версия набора данных для ключей кэша. Хранится в базе, когда
+    кэш Django у каждого процесса свой (см. recipes.cache).
+    """
+    name = models.CharField(
+        max_length=255,
+        primary_key=True,
+        verbose_name='Набор данных'
+    )
+    version = models.BigIntegerField(
+        default=0,
+        verbose_name='Версия'
+    )
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
+
+    class Meta:
+        verbose_name = 'Версия кэша'
+        verbose_name_plural = 'Версии кэша'
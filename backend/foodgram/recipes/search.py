@@ -0,0 +1,174 @@
+import re
+import threading
+from bisect import bisect_left
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+from .cache import get_version
+from .models import Ingredient
+
+
+def normalize(value):
+    """Приводит строку к виду для поиска без учета регистра и буквы «ё»."""
+    return value.casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Загружается при первом обращении и перестраивается,
+    когда меняется версия ингредиентов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._index = ([], [])
+
+    def _load(self):
+        version = get_version('ingredients')
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            rows = sorted(
+                (normalize(ingredient.name), ingredient.id, ingredient)
+                for ingredient in Ingredient.objects.order_by().only(
+                    'id', 'name', 'measurement_unit'
+                )
+            )
+            self._index = (
+                [key for key, _, _ in rows],
+                [ingredient for _, _, ingredient in rows]
+            )
+            self._version = version
+
+    def search(self, query):
+        """Сначала ингредиенты, начинающиеся с запроса,
+        затем ингредиенты, содержащие его.
+        """
+        self._load()
+        query = normalize(query)
+        keys, ingredients = self._index
+        start = end = bisect_left(keys, query)
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        return ingredients[start:end] + [
+            ingredient for key, ingredient in zip(keys, ingredients)
+            if query in key and not key.startswith(query)
+        ]
+
+
+ingredient_index = IngredientIndex()
+
+
+# Ранжирование и отбор рецептов по запросу для каждой СУБД.
+# В PostgreSQL используется хранимый столбец search_vector с GIN-индексом,
+# в SQLite — таблица FTS5 recipes_recipe_fts (см. миграцию 0008).
+RECIPE_SEARCH_SQL = {
+    'postgresql': (
+        "SELECT id FROM recipes_recipe WHERE search_vector "
+        "@@ websearch_to_tsquery('russian', %s)",
+        "ts_rank_cd(recipes_recipe.search_vector, "
+        "websearch_to_tsquery('russian', %s))",
+    ),
+    'sqlite': (
+        'SELECT rowid FROM recipes_recipe_fts '
+        'WHERE recipes_recipe_fts MATCH %s',
+        '(SELECT -bm25(recipes_recipe_fts, 10.0, 1.0) '
+        'FROM recipes_recipe_fts WHERE recipes_recipe_fts MATCH %s '
+        'AND recipes_recipe_fts.rowid = recipes_recipe.id)',
+    ),
+}
+
+
+# Триггеры, синхронизирующие recipes_recipe_fts с recipes_recipe.
+# SQLite пересоздает таблицу при изменении ее схемы в миграциях
+# и теряет триггеры, поэтому они восстанавливаются после migrate.
+SQLITE_FTS_VALUES = (
+    "replace(replace({0}.name, 'ё', 'е'), 'Ё', 'Е'), "
+    "replace(replace({0}.text, 'ё', 'е'), 'Ё', 'Е')"
+)
+SQLITE_FTS_INSERT = (
+    'INSERT INTO recipes_recipe_fts(rowid, name, text) '
+    'VALUES (new.id, ' + SQLITE_FTS_VALUES.format('new') + ');'
+)
+SQLITE_FTS_DELETE = (
+    'INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text) '
+    "VALUES ('delete', old.id, " + SQLITE_FTS_VALUES.format('old') + ');'
+)
+SQLITE_FTS_TRIGGERS = {
+    'recipes_recipe_fts_insert': (
+        'CREATE TRIGGER recipes_recipe_fts_insert AFTER INSERT '
+        f'ON recipes_recipe BEGIN {SQLITE_FTS_INSERT} END'
+    ),
+    'recipes_recipe_fts_delete': (
+        'CREATE TRIGGER recipes_recipe_fts_delete AFTER DELETE '
+        f'ON recipes_recipe BEGIN {SQLITE_FTS_DELETE} END'
+    ),
+    'recipes_recipe_fts_update': (
+        'CREATE TRIGGER recipes_recipe_fts_update AFTER UPDATE OF name, text '
+        f'ON recipes_recipe BEGIN {SQLITE_FTS_DELETE} {SQLITE_FTS_INSERT} END'
+    ),
+}
+
+
+def restore_sqlite_triggers(using):
+    """Создает потерянные триггеры FTS5 и заново индексирует рецепты,
+    которые могли измениться, пока триггеров не было.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')"
+            " AND name LIKE 'recipes_recipe_fts%'"
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [
+            name for name in SQLITE_FTS_TRIGGERS if name not in existing
+        ]
+        if 'recipes_recipe_fts' not in existing or not missing:
+            return
+        for name in missing:
+            cursor.execute(SQLITE_FTS_TRIGGERS[name])
+        cursor.execute(
+            'INSERT INTO recipes_recipe_fts(recipes_recipe_fts) '
+            "VALUES ('delete-all')"
+        )
+        cursor.execute(
+            'INSERT INTO recipes_recipe_fts(rowid, name, text) SELECT id, '
+            + SQLITE_FTS_VALUES.format('recipes_recipe')
+            + ' FROM recipes_recipe'
+        )
+
+
+def fts5_query(value):
+    """Запрос FTS5: все слова обязательны и ищутся по префиксу,
+    что отчасти заменяет стемминг.
+    """
+    return ' '.join(
+        f'"{word}"*' for word in re.findall(r'\w+', normalize(value))
+    )
+
+
+def search_recipes(queryset, value):
+    """Отбирает рецепты по названию и описанию
+    и сортирует их по релевантности.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor not in RECIPE_SEARCH_SQL:
+        return queryset.filter(name__icontains=value)
+    if vendor == 'sqlite':
+        value = fts5_query(value)
+        if not value:
+            return queryset.none()
+    matches, rank = RECIPE_SEARCH_SQL[vendor]
+    return queryset.filter(
+        id__in=RawSQL(matches, (value,))
+    ).annotate(
+        search_rank=RawSQL(rank, (value,))
+    ).order_by('-search_rank', '-pub_date', '-id')
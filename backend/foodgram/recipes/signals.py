@@ -0,0 +1,172 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import CustomUser, Subscription
+
+from .cache import (AUTHOR_VERSION, RECIPE_VERSION, bump_version,
+                    bump_versions_on_commit)
+from .models import (Favorite, ImageBlob, Ingredient, Recipe,
+                     RecipesIngredient, RecipesTag, ShoppingCart,
+                     ShoppingCartIngredient, Tag)
+from .search import restore_sqlite_triggers
+
+# (модель-источник, модель со счетчиком, внешний ключ, поле счетчика)
+COUNTERS = (
+    (Favorite, Recipe, 'recipe_id', 'favorites_count'),
+    (ShoppingCart, Recipe, 'recipe_id', 'in_carts_count'),
+    (Recipe, CustomUser, 'author_id', 'recipes_count'),
+    (Subscription, CustomUser, 'following_id', 'followers_count'),
+)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    """Добавляет ингредиенты рецепта в список покупок."""
+    if created:
+        ShoppingCartIngredient.objects.add_recipe(
+            [instance.user_id], instance.recipe_id
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    """Убирает ингредиенты рецепта из списка покупок."""
+    ShoppingCartIngredient.objects.remove_recipe(
+        [instance.user_id], instance.recipe_id
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients(sender, **kwargs):
+    """Сбрасывает кэши ингредиентов при их изменении."""
+    bump_version('ingredients')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    """Сбрасывает кэши тегов при их изменении."""
+    bump_version('tags')
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    """Сбрасывает кэш представления рецепта при его изменении."""
+    bump_versions_on_commit([RECIPE_VERSION.format(instance.id)])
+
+
+@receiver(post_save, sender=RecipesIngredient)
+@receiver(post_delete, sender=RecipesIngredient)
+@receiver(post_save, sender=RecipesTag)
+@receiver(post_delete, sender=RecipesTag)
+def invalidate_recipe_relations(sender, instance, **kwargs):
+    """Сбрасывает кэш представления рецепта при изменении
+    его ингредиентов и тегов.
+    """
+    bump_versions_on_commit([RECIPE_VERSION.format(instance.recipe_id)])
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_author(sender, instance, created, **kwargs):
+    """Сбрасывает кэш представлений рецептов автора
+    при изменении его профиля.
+    """
+    if not created:
+        bump_versions_on_commit([AUTHOR_VERSION.format(instance.id)])
+
+
+def restore_search_triggers(sender, using, **kwargs):
+    """Восстанавливает триггеры полнотекстового поиска после migrate."""
+    restore_sqlite_triggers(using)
+
+
+@receiver(post_delete, sender=Tag)
+def clear_tag_bit(sender, instance, **kwargs):
+    """Снимает бит удаленного тега с рецептов,
+    чтобы его не унаследовал новый тег.
+    """
+    Recipe.objects.with_any_tag([instance]).update(
+        tags_mask=F('tags_mask').bitand(~instance.mask)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def count_image_references(sender, instance, **kwargs):
+    """Обновляет счетчики ссылок на изображения рецепта."""
+    loaded = getattr(instance, 'loaded_images', {})
+    current = instance.image_names()
+    ImageBlob.objects.acquire(
+        name for field, name in current.items() if loaded.get(field) != name
+    )
+    ImageBlob.objects.release(
+        name for field, name in loaded.items()
+        if field in current and current[field] != name
+    )
+    instance.loaded_images = current
+
+
+@receiver(post_delete, sender=Recipe)
+def release_image_references(sender, instance, **kwargs):
+    ImageBlob.objects.release(instance.image_names().values())
+
+
+def counter_receivers(model, key, field):
+    """Обработчики, изменяющие счетчик field атомарно через F()."""
+    def increment(sender, instance, created, **kwargs):
+        if created:
+            model.objects.filter(pk=getattr(instance, key)).update(
+                **{field: F(field) + 1}
+            )
+
+    def decrement(sender, instance, **kwargs):
+        model.objects.filter(
+            pk=getattr(instance, key), **{f'{field}__gt': 0}
+        ).update(**{field: F(field) - 1})
+
+    return increment, decrement
+
+
+def update_counters(sender, keys, delta):
+    """Изменяет счетчики объектов keys на delta для связей sender,
+    созданных или удаленных массово, без сигналов моделей.
+    """
+    if not keys:
+        return
+    for source, model, key, field in COUNTERS:
+        if source is not sender:
+            continue
+        queryset = model.objects.filter(pk__in=keys)
+        if delta < 0:
+            queryset = queryset.filter(**{f'{field}__gte': -delta})
+        queryset.update(**{field: F(field) + delta})
+
+
+def bulk_created(sender, user_id, keys):
+    """Повторяет обработчики post_save для связей пользователя,
+    созданных через bulk_create.
+    """
+    update_counters(sender, keys, 1)
+    if sender is ShoppingCart and keys:
+        ShoppingCartIngredient.objects.add_recipes([user_id], keys)
+
+
+def bulk_deleted(sender, user_id, keys):
+    """Повторяет обработчики удаления для связей пользователя,
+    удаленных одним запросом.
+    """
+    update_counters(sender, keys, -1)
+    if sender is ShoppingCart and keys:
+        ShoppingCartIngredient.objects.remove_recipes([user_id], keys)
+
+
+for sender, model, key, field in COUNTERS:
+    increment, decrement = counter_receivers(model, key, field)
+    post_save.connect(
+        increment, sender=sender, weak=False, dispatch_uid=f'{field}_add'
+    )
+    post_delete.connect(
+        decrement, sender=sender, weak=False, dispatch_uid=f'{field}_remove'
+    )
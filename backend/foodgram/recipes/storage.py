@@ -0,0 +1,57 @@
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, именующее файлы по хэшу содержимого.
+
+    Одинаковые файлы сохраняются один раз и используются
+    всеми ссылающимися на них рецептами.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        digest = digest.hexdigest()
+        return posixpath.join(
+            directory, digest[:2], f'{digest}{extension}'
+        )
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # gc_images отсчитывает срок хранения файла от mtime:
+            # повторная загрузка продлевает его, чтобы файл не удалили
+            # до фиксации транзакции, которая на него ссылается.
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                pass
+        temporary_name = super()._save(
+            f'{name}.{uuid.uuid4().hex}.tmp', content
+        )
+        os.replace(self.path(temporary_name), self.path(name))
+        return name
+
+    def walk(self, path=''):
+        """Перебирает все файлы хранилища, начиная с каталога path."""
+        directories, files = self.listdir(path)
+        for filename in files:
+            yield posixpath.join(path, filename)
+        for directory in directories:
+            yield from self.walk(posixpath.join(path, directory))
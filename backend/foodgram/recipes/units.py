@@ -0,0 +1,43 @@
+"""Единицы измерения, которые можно перевести одна в другую.
+
+Количества в совместимых единицах приводятся к основной единице
+в SQL, поэтому «мука 1 кг» и «мука 500 г» в списке покупок
+складываются в одну строку «мука 1500 г».
+"""
+from django.db import models
+from django.db.models import Case, F, Value, When
+
+# Единица: (основная единица, число основных единиц в одной).
+UNITS = {
+    'г': ('г', 1),
+    'кг': ('г', 1000),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+    'стакан': ('мл', 200),
+    'ст. л.': ('мл', 15),
+    'ч. л.': ('мл', 5),
+}
+
+
+def canonical_unit(field):
+    """Выражение: основная единица для единицы из поля field."""
+    return Case(
+        *[
+            When(**{field: unit}, then=Value(base))
+            for unit, (base, _) in UNITS.items() if unit != base
+        ],
+        default=F(field),
+        output_field=models.CharField()
+    )
+
+
+def unit_factor(field):
+    """Выражение: коэффициент перевода в основную единицу."""
+    return Case(
+        *[
+            When(**{field: unit}, then=Value(factor))
+            for unit, (_, factor) in UNITS.items() if factor != 1
+        ],
+        default=Value(1),
+        output_field=models.IntegerField()
+    )
@@ -0,0 +1,49 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, key):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{key: OuterRef('pk')})
+            .order_by().values(key).annotate(count=Count('pk'))
+            .values('count'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def fill_counters(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Subscription = apps.get_model('users', 'Subscription')
+    CustomUser.objects.update(
+        recipes_count=count_subquery(Recipe, 'author'),
+        followers_count=count_subquery(Subscription, 'following')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0001_initial'),
+        ('users', '0002_auto_20230512_1449'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Число подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Число рецептов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2 on 2026-10-18 06:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_customuser_counters'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='subscription',
+            options={'verbose_name': 'Подписки', 'verbose_name_plural': ('Подписки',)},
+        ),
+        migrations.RenameField(
+            model_name='subscription',
+            old_name='follower',
+            new_name='user',
+        ),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(fields=('email', 'password'), name='unique_password_email'),
+        ),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('user', 'following'), name='unique_user_following'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_subscription_user'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число подписчиков'),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число рецептов'),
+        ),
+    ]
@@ -4,7 +4,31 @@ from django.db import models
 from foodgram.settings import NAME_MAX_LENGTH, USER_EMAIL_MAX_LENGTH
 
 
-class CustomUser(AbstractUser):
+class CounterFieldsMixin:
+    """Модель со счетчиками, которые меняются только запросами
+    UPDATE с F() (см. recipes.signals). Сохранение существующего
+    объекта не записывает счетчики, чтобы устаревшие значения
+    в памяти не затирали изменения других запросов.
+    """
+    COUNTER_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert'):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                deferred = self.get_deferred_fields()
+                update_fields = [
+                    field.attname for field in self._meta.concrete_fields
+                    if not field.primary_key and field.attname not in deferred
+                ]
+            kwargs['update_fields'] = [
+                name for name in update_fields
+                if name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class CustomUser(CounterFieldsMixin, AbstractUser):
     """Модель пользователей."""
     email = models.EmailField(
         max_length=USER_EMAIL_MAX_LENGTH,
@@ -35,7 +59,18 @@ class CustomUser(AbstractUser):
         max_length=NAME_MAX_LENGTH,
         verbose_name='Пароль'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число подписчиков'
+    )
 
+    COUNTER_FIELDS = ('recipes_count', 'followers_count')
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name', 'password']
 